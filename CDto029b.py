@@ -9,14 +9,48 @@ import serial
 import time
 import sys
 import logging
+import asyncio
+import contextlib
 import threading
+from collections import deque
 from datetime import datetime
+from card_protocol import TextProtocol, kReplyAck, kReplyError, kReplyNak, kReplyEoj, kReplyCorrupt
+from punch_session import PunchSession, kBinaryProtocol, kMaxBaudRate
+from punch_async import SerialStream
+from punch_journal import PunchJournal
+from card_index import card_index
+from deck_follow import follow_lines
+from deck_stream import is_stream, stream_lines, stream_name
+from deck_validate import validate_deck, card_errors
+from punch_log import JobLog
+from punch_metrics import JobMetrics, export_metrics
+
+# Max number of cards sent to the Arduino before waiting for their
+# acknowledgement. 1 is stop-and-wait; larger windows keep the next cards
+# queued in the Arduino (the firmware must buffer them, the Mega 2560 serial
+# receive buffer alone holds only 64 bytes).
+kPunchWindow = 1
+
+# Deadlines of the punch operations (seconds)
+kAckTimeout = 60        # Card acknowledgement
+kMaxAckTimeouts = 3     # Acknowledgement timeouts before giving up
+kEojTimeout = 60        # EOJ response
+
+# Deck with cards the punch cannot punch
+class DeckError(Exception):
+    pass
+
+# Fatal error of the punch on a card
+class PunchError(Exception):
+    def __init__(self, msg, card_number):
+        super().__init__(msg)
+        self.card_number = card_number
 
 punching_stopped = threading.Event()
     
 # Just for testing
 # ------------------------------------------------------------------------------
-def punch_file_test(file_path, range = None, punch_all = True, log = None):
+def punch_file_test(file_path, range = None, punch_all = True, log = None, session = None):
 
     punching_stopped.clear()
 
@@ -125,11 +159,11 @@ def punch_file_test(file_path, range = None, punch_all = True, log = None):
         send_log(f"{minutestamp} Punch completed.")
         report += f"Punch completed.\n"
         
-    if punch_counter != rows_to_punch or punch_all == False:
+    if punch_counter != rows_to_punch or punch_all == False or punch_aborted:
         send_log(f"{minutestamp} File punched partially.")
         report += f"File punched partially.\n"
  
-    if punch_counter == rows_to_punch and punch_all == True:
+    if punch_counter == rows_to_punch and punch_all == True and not punch_aborted:
         send_log(f"{minutestamp} File punched completely.")
         report += f"File punched completely.\n"
        
@@ -138,267 +172,525 @@ def punch_file_test(file_path, range = None, punch_all = True, log = None):
        
     return report, punch_aborted, (start_row, end_row)
  
-# Send the file to the Arduino line by line
+# Lines of a file for the async punch loop
 # ------------------------------------------------------------------------------   
-def punch_file(file_path, range = None, punch_all = True, log = None):
-    # USB port D: home  line37   f; CHM
-    # Configure the serial port (adjust as needed)
-    usb_port = 'COM4'    # at CHM
-    # usb_port = 'COM13' # at home
-    # usb_port = "/dev/tty.usbserial-A50285BI" # for macOS
-    baud_rate = 9600
-    timeout = 60 # seconds
+async def iterate_lines(file):
+    for line in file:
+        yield line
+
+# Send the file to the Arduino line by line.
+# Pass a PunchSession to keep the port open across jobs, otherwise a session is
+# opened for this job only. stop_event stops the job (punching_stopped if None).
+# progress(cards punched, cards to punch) is called at every card punched.
+# Every card punched is recorded in the job journal (unless journal is False),
+# resume restarts the job after the last card recorded by a previous run.
+# With follow the cards appended to the file while punching are punched too
+# (see deck_follow.py), the end of the range is ignored; every card is checked
+# when read and the job stops at the first one that cannot be punched.
+# Unless validate is False the cards are checked before opening the port and
+# the job is not started if any of them cannot be punched.
+# file_path can be a stream of cards too: "-" (stdin), a FIFO, a file object or
+# an iterable of lines (see deck_stream.py). A stream is punched as its cards
+# come, to its end or to the end of range (range None for all of it); every
+# card is checked when it comes and the job stops at the first one that cannot
+# be punched. A stream has no journal.
+# The throughput and latency of the job are recorded in metrics (a JobMetrics,
+# one is made if None) and exported at the end of the job (punch_metrics.py)
+# unless export is False (the farm exports the metrics of all its punches).
+# ------------------------------------------------------------------------------   
+async def punch_file_async(file_path, range = None, punch_all = True, log = None, window = kPunchWindow, port = None,
+                           binary = kBinaryProtocol, max_baud = kMaxBaudRate, session = None, stop_event = None, progress = None,
+                           journal = True, resume = False, follow = False, validate = True, metrics = None,
+                           export = True):
+    window = max(1, int(window))
     
-    punching_stopped.clear()
+    if stop_event is None:
+        stop_event = punching_stopped
 
-    msg = ""
-    EOJmsg = ""
+    loop = asyncio.get_running_loop()
         
-    log_dir = "LOGS"
-    os.makedirs(log_dir, exist_ok = True)
-
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    log_filename = os.path.join(log_dir, f"app_log_{timestamp}.log")
-    logging.basicConfig(filename = log_filename, level = logging.INFO)
- 
-    # Emits the log
-    def send_log(msg: str):
-        logging.info(msg)
-        if log:
-            try:
-                log(msg)
+    streamed = is_stream(file_path)
+    if streamed:
+        # Without a range the end is known only when the stream ends
+        punch_all = range is None
+        range = range or (1, 0)
+        validate = False
+        journal = False
+        resume = False
+    deck_name = stream_name(file_path) if streamed else file_path
 
-            except Exception:
-                pass
- 
-    # d: at home  e: at chm
-    if not file_path:
-        punch_all = True
-        file_path = input("Please enter the name of the file you want to punch: ")
-        if not file_path:
-            print("No file to punch.")
-            sys.exit(0) 
+    # Logging a message only queues it, the punch log listener writes it
+    job_log = JobLog(deck_name, log)
     
     start_row, end_row = range
-    range_str = f"{start_row} to {end_row}"
+    range_str = f"{start_row} to {end_row}" if not (streamed and punch_all) else "all the cards of the stream"
 
-    print(f"Log to file: {os.path.basename(log_filename)}\n")    
-    print("File to punch: {file_path}")    
-    print("Rows to punch: {range_str} {'(all file)' if punch_all else ''}")
- 
-    minutestamp = datetime.now().strftime('%H:%M:%S')
-    
-    send_log(f"{minutestamp} Log to file: {os.path.basename(log_filename)}")
-    send_log(f"{minutestamp} File to punch: {file_path}")   
-    send_log(f"{minutestamp} Rows to punch: {range_str} {'(all rows)' if punch_all else ''}\n")   
+    job_log.info(f"Punch job: {job_log.job}")
+    job_log.info(f"File to punch: {deck_name}")
+    job_log.info(f"Rows to punch: {range_str} {'(all rows)' if punch_all else ''}")
+    job_log.info(f"Send window: {window} card(s)")
   
     punch_aborted = False
+    punch_error = None
+
+    if follow:
+        # The deck grows until the end: no end row and no journal keyed by
+        # the content of the deck
+        punch_all = True
+        journal = False
+    # The last row is the last card that comes
+    growing = follow or (streamed and punch_all)
+
+    # The file work runs on a worker thread, the loop is shared with the
+    # other jobs (the GUI, the spooler, the farm)
+
+    # Pre-flight check of the cards to punch (a deck being written is not
+    # complete yet)
+    deck_error = None
+    if validate and not follow:
+        try:
+            deck = await loop.run_in_executor(None, validate_deck, file_path, (start_row, end_row))
+            for line in deck.format().splitlines():
+                job_log.log(logging.INFO if deck.ok else logging.WARNING, line)
+            if not deck.ok:
+                deck_error = deck.summary()
+        except OSError:
+            # Reported when the file is opened
+            pass
+
+    # Journal of the cards punched, to resume the job if interrupted
+    first_row = start_row
+    if deck_error:
+        journal = None
+    if journal:
+        try:
+            journal = await loop.run_in_executor(None, lambda: PunchJournal(file_path, range).open(resume))
+            if resume and journal.last_card is not None:
+                first_row = journal.last_card + 1
+                job_log.info(f"Resuming after row {journal.last_card}")
+        except OSError as e:
+            job_log.warning(f"Journal not available: {e}")
+            journal = None
+
+    rows_to_punch = max(0, end_row - first_row + 1)
+    line_counter = -1
+    punch_counter = 0
+
+    own_session = session is None
+    if own_session:
+        session = PunchSession(port, binary = binary, max_baud = max_baud)
+
+    # Wait for the job using the session, if any, without blocking the loop
+    await loop.run_in_executor(None, session.lock.acquire)
+    # A stop of the previous job is not for this one
+    stop_event.clear()
+    stream = None
  
     try:
-        # Open the serial port to the 029 arudino
-        ser = serial.Serial(usb_port, baud_rate)
-        print(f"Connected to {usb_port} at {baud_rate} baud")
-        
-        # send the start command to the 029 arduino and print the response    
-        ser.write("start   \n".encode('utf-8'))
-        print(f"{timestamp} Sent: Start command")
-        minutestamp = datetime.now().strftime('%H:%M:%S') 
-        send_log(f"{minutestamp} Sent: Start command")   
-        msg=""
-        
-        while True:
-            # Read a line from the serial port  the start  command response
-            msg = ser.readline()
+        if deck_error:
+            raise DeckError(deck_error)
+
+        # Open the port and start the Arduino program unless still connected
+        if not await loop.run_in_executor(None, session.ensure_open, job_log.info):
+            job_log.info(f"Using the connection to {session.port}: {session.baud_rate} baud, {session.protocol.name} protocol")
+
+        protocol = session.protocol
+        session.jobs += 1
+        if metrics is None:
+            metrics = JobMetrics()
+        metrics.start(job_log.job, session.port)
+
+        # Nothing from a previous job is an answer to this one
+        session.ser.reset_input_buffer()
+        protocol.reset()
+        stream = SerialStream(session.ser).open()
+
+        # Replies decoded by the reader task
+        replies = asyncio.Queue()
+
+        async def reader():
+            try:
+                while True:
+                    data = await stream.read()
+                    for reply in protocol.feed(data):
+                        replies.put_nowait(reply)
+            except (serial.SerialException, OSError) as e:
+                replies.put_nowait(e)
+
+        read_task = asyncio.ensure_future(reader())
+
+        # Next reply, raises when the link dropped or on timeout
+        async def next_reply(timeout):
+            reply = await asyncio.wait_for(replies.get(), timeout)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
 
-            # Check if any data was received
-            if msg:
-                # Decode the received bytes to string (handle potential errors)
+        # Cards sent to the Arduino and not acknowledged yet, oldest first,
+        # as (sequence number, card number, line) tuples.
+        # With a window of 1 this is the classic stop-and-wait transmission.
+        in_flight = deque()
+
+        # Cards in flight acknowledged by a reply (acks are cumulative), None
+        # for a repeated ack of a card already acknowledged
+        def pop_acked(reply):
+            if reply.seq is None:
+                return [in_flight.popleft()]
+            if not any(seq == reply.seq for seq, _, _ in in_flight):
+                return None
+            acked = []
+            while not acked or acked[-1][0] != reply.seq:
+                acked.append(in_flight.popleft())
+            return acked
+
+        # Cards punched, counted and journaled (the record is fsync'd)
+        async def punched(acked):
+            nonlocal punch_counter
+
+            if not acked:
+                return
+            punch_counter += len(acked)
+            for seq, _, _ in acked:
+                metrics.card_acked(seq)
+            if journal:
+                await loop.run_in_executor(None, journal.record, acked[-1][1])
+            if progress:
+                progress(punch_counter, rows_to_punch)
+
+        # After an ERROR the firmware still punches the cards it already has:
+        # wait for their replies, so they are counted and journaled and a
+        # resumed job does not punch them again. Returns the card numbers.
+        async def drain_after_error():
+            drained = []
+            while in_flight:
                 try:
-                    data = msg.decode('utf-8')             
-                    print("Started Arduino program:",data)
-                    minutestamp = datetime.now().strftime('%H:%M:%S')
-                    send_log(f"{minutestamp} Received: {data} ")   
+                    reply = await next_reply(kAckTimeout)
+                except asyncio.TimeoutError:
+                    job_log.warning("Timeout: no response from the punch after the error", in_flight[0][1])
                     break
-                except UnicodeDecodeError:
-                    print("Error decoding data")
-                    
-            else:
-                print("Timeout: No data received")
-                     
-        rows_to_punch = end_row - start_row + 1
-        line_counter = -1
-        punch_counter = 0
+                if reply.kind == kReplyNak:
+                    # Dropped by the firmware from there on, not punched
+                    break
+                if reply.kind == kReplyCorrupt and not isinstance(protocol, TextProtocol):
+                    metrics.corrupt_replies += 1
+                    await stream.write(protocol.encode_query(in_flight[0][0]))
+                    continue
+                acked = pop_acked(reply)
+                if acked is None:
+                    continue
+                if reply.kind == kReplyError:
+                    job_log.error(f"Punch error: {reply.text.strip()}", acked[-1][1])
+                    acked = acked[:-1]
+                await punched(acked)
+                drained += [card_number for _, card_number, _ in acked]
+            return drained
+
+        # Wait for the acknowledgement of the oldest card in flight
+        async def wait_ack():
+            timeouts = 0
+            
+            while True:
+                # Read a reply from the 029 serial port
+                try:
+                    reply = await next_reply(kAckTimeout)
+
+                except asyncio.TimeoutError:
+                    timeouts += 1
+                    metrics.timeouts += 1
+                    job_log.warning("Timeout: no response from the punch", in_flight[0][1])
+                    if timeouts >= kMaxAckTimeouts:
+                        raise PunchError(f"No response from the punch for card {in_flight[0][1]}", in_flight[0][1])
+                    # Ask the firmware to repeat the lost acknowledgement
+                    await stream.write(protocol.encode_query(in_flight[0][0]))
+                    continue
+
+                if reply.kind == kReplyCorrupt:
+                    metrics.corrupt_replies += 1
+                    job_log.warning("Error decoding the response", in_flight[0][1])
+                    if not isinstance(protocol, TextProtocol):
+                        # Ask the firmware to repeat the lost acknowledgement
+                        await stream.write(protocol.encode_query(in_flight[0][0]))
+                        continue
+                    # A text reply line is the reply of the oldest card in
+                    # flight even if garbled, and it cannot be asked again
+
+                if reply.kind == kReplyNak:
+                    # A card frame got corrupted on the way to the Arduino, it
+                    # dropped it and the ones after it: send them again
+                    job_log.warning(f"Card frame {reply.seq} corrupted, resending")
+                    resend = False
+                    for seq, _, card in in_flight:
+                        resend = resend or seq == reply.seq
+                        if resend:
+                            await stream.write(protocol.encode_card(seq, card))
+                            metrics.resends += 1
+                    continue
+
+                msg = reply.text
+
+                acked = pop_acked(reply)
+                if acked is None:
+                    continue
+                
+                card_number = acked[-1][1]
+                job_log.debug(f"Received (card {card_number}): {msg.strip()}", card_number)
+                
+                if reply.kind == kReplyError:
+                    # The cards acknowledged with it were punched
+                    await punched(acked[:-1])
+                    after = await drain_after_error()
+                    error = PunchError(msg.strip(), card_number)
+                    if after:
+                        error = PunchError(f"{msg.strip()}; cards {after[0]} to {after[-1]} were punched after it, "
+                                           f"punch card {card_number} again", card_number)
+                    raise error
+
+                await punched(acked)
+                
+                break
 
         try:
-            with open(file_path, 'r') as file:
+            with contextlib.nullcontext() if streamed else open(file_path, 'r') as file:
                 
                 line_counter += 1
+
+                # Go straight to the first row to punch
+                start_offset = 0
+                if streamed:
+                    # The cards before the first row are read and dropped
+                    line_counter = first_row - 1
+                elif first_row > 1:
+                    start_offset = card_index(file_path).offset(first_row)
+                    file.seek(start_offset)
+                    line_counter = first_row - 1
+
+                if streamed:
+                    lines = stream_lines(file_path, skip = first_row - 1, stop_event = stop_event)
+                elif follow:
+                    lines = follow_lines(file_path, start_offset, stop_event = stop_event, log = job_log.info)
+                else:
+                    lines = iterate_lines(file)
                 
-                for line in file:
-                    if punching_stopped.is_set():
+                async for line in lines:
+                    if stop_event.is_set():
                         end_row = line_counter
                         punch_aborted = True
                         break
 
                     line_counter += 1
                     
-                    if not punch_all:
-                        if not (start_row <= line_counter <= end_row):
-                            continue
+                    if not punch_all or first_row != start_row:
+                        if line_counter > end_row:
+                            break
+
+                    # The cards of a stream or of a deck being written are
+                    # checked as they come, not before the job
+                    if streamed or follow:
+                        errors = card_errors(line.rstrip("\r\n"))
+                        if errors:
+                            column, kind, detail = errors[0]
+                            punch_aborted = True
+                            punch_error = f"Card {line_counter} not punched: {kind} at column {column} ({detail})"
+                            job_log.error(punch_error, line_counter)
+                            line_counter -= 1
+                            break
+
+                    # Keep at most window cards queued in the Arduino
+                    while len(in_flight) >= window:
+                        await wait_ack()
 
-                    msg = "data" + line
-                    msg = msg.encode('utf-8')
                     # Send the data + line through the serial port
-                    ser.write(msg)
-                    
-                    print(f"Message sent: {len(line)-1} data chars to punch:")
-                    print(f"{line.strip()}")
-                    minutestamp = datetime.now().strftime('%H:%M:%S')
-                    send_log(f"{minutestamp} Sent: {line.strip()}")
+                    seq = session.next_sequence()
+                    frame = protocol.encode_card(seq, line)
+                    write_start = time.monotonic()
+                    await stream.write(frame)
+                    metrics.card_sent(seq, len(frame), time.monotonic() - write_start)
+                    in_flight.append((seq, line_counter, line))
+                    if growing:
+                        rows_to_punch = line_counter - first_row + 1
                     
-                    while True:
-                        # Read a line from the 029 serial port
-                        msg = ser.readline()
-                     
-                        # Check if any data was received
-                        if msg:
-                            # Decode the received bytes to string (handle potential errors)
-                            try:
-                                msg = msg.decode('utf-8')       
-                                print(f"Received message:") 
-                                print(f"{msg}")
-                                
-                                minutestamp = datetime.now().strftime('%H:%M:%S')
-                                send_log(f"{minutestamp} Received: {msg}")
-                                
-                                if "ERROR" in msg:
-                                    minutestamp = datetime.now().strftime('%H:%M:%S')
-                                    send_log(f"{minutestamp} Sent: {msg}")  
-                                    print("fatal error in keypunch program terminating")                        
-                                    sys.exit(0)       
-
-                                punch_counter += 1
-                                
-                                break
-                                
-                            except UnicodeDecodeError:
-                                print("Error decoding data")
-                        else:
-                            print("Timeout: No punch responce received")
-                            minutestamp = datetime.now().strftime('%H:%M:%S')
-                            send_log(f"{minutestamp} Timeout no response from punch received")
+                    job_log.debug(f"Sent (card {line_counter}): {line.strip()}", line_counter)
+
+                # The cards still in flight are already in the Arduino buffer
+                # and get punched anyway, wait for them before sending EOJ
+                while in_flight:
+                    await wait_ack()
+
+                if follow or streamed:
+                    # Stopped while waiting for new cards
+                    punch_aborted = punch_aborted or stop_event.is_set()
+                    end_row = line_counter if growing else min(end_row, line_counter)
                             
+        except serial.SerialException:
+            # A SerialException is an OSError too: the link dropped, no EOJ
+            raise
         except FileNotFoundError:
-            print("File not found")
+            job_log.error("File not found")
+            punch_aborted = True
+            end_row = first_row + punch_counter - 1
         except PermissionError:
-            print("Permission error")
+            job_log.error("Permission error")
+            punch_aborted = True
+            end_row = first_row + punch_counter - 1
         except OSError as e:
-            print("OS error:", e)
+            job_log.error(f"OS error: {e}")
+            punch_aborted = True
+            end_row = first_row + punch_counter - 1
             
         # if file was not empty
         if line_counter > 0:
             if punch_aborted:
-                print("File punching interrupted.")
+                job_log.info("File punching interrupted.")
             else:
-                print("File punching complete.") 
+                job_log.info("File punching complete.") 
       
             # end of file send eoj to 029
-            ser.write("eoj\n".encode('utf-8'))  
-            
-            print("Sent EOJ.")
+            eoj_seq = session.next_sequence()
+            await stream.write(protocol.encode_eoj(eoj_seq))
             
-            minutestamp = datetime.now().strftime('%H:%M:%S')
-            send_log(f"{minutestamp} Sent EOJ.") 
+            job_log.info("Sent EOJ.") 
      
             # Check EOJ response
+            eoj_deadline = time.monotonic() + kEojTimeout
             while True:
-                # Read a line from the serial port check if it is the
-                eojMsg = ser.readline()
-
-                # Check if any data was received
-                if eojMsg:
-                    # Decode the received bytes to string (handle potential errors)
-                    try:
-                        eojStr = eojMsg.decode('utf-8').strip()
-                        
-                        print(f"Received EOJ response: {eojStr}")
-                        
-                        minutestamp = datetime.now().strftime('%H:%M:%S')
-                        send_log(f"{minutestamp} Received EOJ response: {eojStr}\n")  
+                # Read a reply from the serial port
+                try:
+                    reply = await next_reply(max(0, eoj_deadline - time.monotonic()))
+
+                except asyncio.TimeoutError:
+                    job_log.warning("Timeout: No EOJ response received.")
+                    break
+
+                if reply.kind == kReplyCorrupt:
+                    metrics.corrupt_replies += 1
+                    job_log.warning("Error decoding EOJ response.")
+                    # With every card acknowledged only the EOJ response is
+                    # pending: this was it, no need to wait for the timeout
+                    if not in_flight:
                         break
-                        
-                    except UnicodeDecodeError:
-                        print("Error decoding EOJ response")
-                        
-                        minutestamp = datetime.now().strftime('%H:%M:%S')
-                        send_log(f"{minutestamp} Error decoding EOJ response.\n")
-                else:
-                    print("Timeout: No EOJ response received")   
-                        
-                    minutestamp = datetime.now().strftime('%H:%M:%S')
-                    send_log(f"{minutestamp} Timeout: No EOJ response received.\n")
+
+                elif reply.kind in (kReplyEoj, kReplyAck, kReplyError) and (reply.seq is None or reply.seq == eoj_seq):
+                    eojStr = reply.text.strip()
                     
-        elif line_counter == 0:
-            print("File is empty")
-            
-            minutestamp = datetime.now().strftime('%H:%M:%S')
-            send_log(f"{minutestamp} File is empty.\n")
+                    job_log.info(f"Received EOJ response: {eojStr}")  
+                    break
+                    
+        elif line_counter == 0 and not punch_aborted:
+            job_log.info("File is empty.")
+
+    except DeckError as e:
+        punch_aborted = True
+        punch_error = f"Deck not punched: {e}"
+        end_row = first_row - 1
+
+    except PunchError as e:
+        punch_aborted = True
+        punch_error = str(e)
+        end_row = e.card_number - 1
+        job_log.error(f"Punch error: {punch_error}", e.card_number)
+        # Start over with a fresh board at the next job
+        session.close()
      
     except serial.SerialException as e:
-        print(f"Error: Could not open serial port: {e}")
+        punch_aborted = True
+        punch_error = f"Serial port error: {e}"
+        end_row = first_row + punch_counter - 1
+        job_log.error(f"Error: {punch_error}")
+        # The next job reconnects
+        session.link_lost = True
+        session.close()
     except FileNotFoundError:
-        print("Error: Text file not found.")
+        punch_aborted = True
+        end_row = first_row + punch_counter - 1
+        job_log.error("Error: Text file not found.")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        punch_aborted = True
+        punch_error = f"Unexpected error: {e}"
+        end_row = first_row + punch_counter - 1
+        job_log.error(f"An unexpected error occurred: {e}")
 
     finally:
-        minutestamp = datetime.now().strftime('%H:%M:%S')
-        send_log(f"{minutestamp} Closing ports and exiting.")
-        
-        # Ensure the serial port is closed
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
-            print("Serial port closed.")
-            
-    minutestamp = datetime.now().strftime('%H:%M:%S')
+        if stream is not None:
+            read_task.cancel()
+            stream.close()
 
-    range_str = f"{start_row} to {end_row}"
+        session.lock.release()
+
+        # Ensure the serial port is closed unless the session is kept open
+        if own_session:
+            job_log.debug("Closing ports and exiting.")
+            session.close()
+
+        # Keep the journal of an incomplete job to resume it
+        if journal:
+            if not punch_aborted and punch_counter == rows_to_punch:
+                journal.finish()
+            else:
+                journal.close()
+
+    # Throughput and latency, if the punch was reached
+    if metrics is not None and metrics.job == job_log.job:
+        metrics.finish()
+        job_log.info(f"Metrics: {metrics.format()}")
+        if export:
+            try:
+                await loop.run_in_executor(None, export_metrics, metrics)
+            except OSError as e:
+                job_log.warning(f"Metrics not exported: {e}")
+            
+    range_str = f"{first_row} to {end_row}" if end_row >= first_row else "none"
 
     report = f""
 
+    if punch_error:
+        report += f"Punch error: {punch_error}\n"
+
     if punch_aborted:
-        send_log(f"{minutestamp} Punch interrupted.")
+        job_log.info("Punch interrupted.")
         report += f"Punch interrupted.\n"
     else:
-        send_log(f"{minutestamp} Punch completed.")
+        job_log.info("Punch completed.")
         report += f"Punch completed.\n"
     
-    if punch_counter != rows_to_punch or punch_all == False:
-        send_log(f"{minutestamp} File punched partially.")
+    if punch_counter != rows_to_punch or punch_all == False or punch_aborted:
+        job_log.info("File punched partially.")
         report += f"File punched partially.\n"
 
-    if punch_counter == rows_to_punch and punch_all == True:
-        send_log(f"{minutestamp} File punched completely.")
+    if punch_counter == rows_to_punch and punch_all == True and not punch_aborted:
+        job_log.info("File punched completely.")
         report += f"File punched completely.\n"
    
-    send_log(f"{minutestamp} Rows punched: {range_str}\n")
+    job_log.info(f"Rows punched: {range_str}")
     report += f"Rows punched: {range_str}."
-         
-    for h in logging.getLogger().handlers[:]:
-            if isinstance(h, logging.FileHandler):
-                h.close()
-                logging.getLogger().removeHandler(h)
     
-    return report, punch_aborted, (start_row, end_row)
+    return report, punch_aborted, (first_row, end_row)
+
+# Blocking version of punch_file_async for the scripts
+# ------------------------------------------------------------------------------   
+def punch_file(file_path, range = None, punch_all = True, log = None, **kwargs):
+    return asyncio.run(punch_file_async(file_path, range, punch_all, log, **kwargs))
     
+# Count the rows (cards) in a file
+# ------------------------------------------------------------------------------   
+def count_rows(file_path):
+    return card_index(file_path).rows
+
 if __name__ == "__main__":
     try:
-        file = ""
+        resume = "--resume" in sys.argv[1:]
+        follow = "--follow" in sys.argv[1:]
+        files = [arg for arg in sys.argv[1:] if arg not in ("--resume", "--follow")]
         
-        if len(sys.argv) == 2:
-            file = sys.argv[1]
+        if not files:
+            files = [input("Please enter the name of the file you want to punch: ")]
+            if not files[0]:
+                print("No file to punch.")
+                sys.exit(0) 
 
-        punch_file(file)
+        # One connection to the punch for all the files
+        with PunchSession() as session:
+            for file in files:
+                punch_file(file, range = (1, count_rows(file)), session = session, resume = resume, follow = follow)
         
         sys.exit(0)
         
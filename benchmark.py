@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# benchmark.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Benchmarks of the software side of the puncher, to compare commits:
+#   startup   time to import the punch engine and the GUI modules
+#   readers   card index (cold and warm), line reading, validation and
+#             Hollerith encoding of synthetic decks up to a million cards
+#   select    what MainView.select_file does with a deck (count and check)
+#   log       punch log records per second through the queue
+#   punch     punch_file against the keypunch emulator with no mechanical
+#             delay: host time per card at several send windows
+# The synthetic decks are made with a fixed seed, so every run reads the same
+# cards. Results are printed and written as JSON (--output); --compare shows
+# the change from a previous JSON file.
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+
+kBenchDir = os.path.join(tempfile.gettempdir(), "029-puncher-bench")
+kDeckSizes = (1000, 100000, 1000000)
+kPunchCards = 2000
+kPunchWindows = (1, 8)
+kLogRecords = 100000
+kRepeat = 3
+kSeed = 29
+
+kDeckChars = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,()+-*/=$'"
+
+kRepoDir = os.path.dirname(os.path.abspath(__file__))
+
+# Deck of random cards of 1 to 80 columns, made once and kept
+def synthetic_deck(cards, seed = kSeed):
+    os.makedirs(kBenchDir, exist_ok = True)
+    path = os.path.join(kBenchDir, f"synthetic_{cards}_{seed}.cd")
+    if not os.path.exists(path):
+        rnd = random.Random(seed)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", newline = "\n") as f:
+            for _ in range(cards):
+                f.write("".join(rnd.choices(kDeckChars, k = rnd.randint(1, 80))) + "\n")
+        os.replace(tmp_path, path)
+    return path
+
+# Best and median wall time of repeat runs of func (setup runs before every
+# one of them, not timed)
+def measure(func, repeat = kRepeat, setup = None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {"best": round(times[0], 6), "median": round(times[len(times) // 2], 6)}
+
+# Peak of the memory allocated by func (Python and numpy)
+def peak_memory(func, setup = None):
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_startup(args):
+    results = {}
+    for name, module in (("engine", "CDto029b"), ("gui", "main_window")):
+        def run():
+            subprocess.run([sys.executable, "-c", f"import {module}"], cwd = kRepoDir, check = True,
+                           env = dict(os.environ, QT_QPA_PLATFORM = "offscreen"), stdout = subprocess.DEVNULL)
+        try:
+            results[name] = measure(run, repeat = args.repeat)
+        except (OSError, subprocess.CalledProcessError) as e:
+            results[name] = {"error": str(e)}
+    return results
+
+def bench_readers(args):
+    import card_index
+    from CDto029b import iterate_lines
+    from deck_validate import validate_deck
+    from hollerith import encode_deck, np
+
+    results = {}
+    for cards in args.cards:
+        deck = synthetic_deck(cards)
+
+        # Neither the sidecar nor the in-memory index: built from the deck
+        def cold():
+            card_index.forget_index(deck, sidecar = True)
+
+        async def read_lines():
+            with open(deck, "r") as f:
+                async for _ in iterate_lines(f):
+                    pass
+
+        def warm():
+            card_index.forget_index(deck)
+
+        entry = {
+            "bytes": os.path.getsize(deck),
+            "index_cold": measure(lambda: card_index.count_rows(deck), args.repeat, setup = cold),
+            "index_sidecar": measure(lambda: card_index.count_rows(deck), args.repeat, setup = warm),
+            "index_memory": measure(lambda: card_index.count_rows(deck), args.repeat),
+            "iterate_lines": measure(lambda: asyncio.run(read_lines()), args.repeat),
+            "validate": measure(lambda: validate_deck(deck), args.repeat),
+            "index_cold_peak_bytes": peak_memory(lambda: card_index.count_rows(deck), setup = cold),
+            "validate_peak_bytes": peak_memory(lambda: validate_deck(deck)),
+        }
+        if np is not None:
+            entry["encode"] = measure(lambda: encode_deck(deck), args.repeat)
+            entry["encode_peak_bytes"] = peak_memory(lambda: encode_deck(deck))
+        entry["per_card_us"] = {key: round(value["best"] * 1e6 / cards, 3) for key, value in entry.items() if isinstance(value, dict)}
+        results[str(cards)] = entry
+    return results
+
+# MainView.select_file: rows counted and deck checked on a deck never seen
+def bench_select(args):
+    import card_index
+    from deck_validate import validate_deck
+
+    results = {}
+    for cards in args.cards:
+        deck = synthetic_deck(cards)
+
+        def cold():
+            card_index.forget_index(deck, sidecar = True)
+
+        def select():
+            card_index.count_rows(deck)
+            validate_deck(deck)
+
+        results[str(cards)] = measure(select, args.repeat, setup = cold)
+    return results
+
+def bench_log(args):
+    import punch_log
+
+    job_log = punch_log.JobLog("benchmark.cd")
+    records = args.log_records
+
+    def run():
+        for card in range(records):
+            job_log.debug(f"Sent (card {card}): ABCDEFGHIJKLMNOPQRSTUVWXYZ", card)
+
+    start = time.perf_counter()
+    run()
+    queued = time.perf_counter() - start
+    # Until the listener wrote them all
+    punch_log.stop_logging()
+    written = time.perf_counter() - start
+    return {
+        "records": records,
+        "queue_us_per_record": round(queued * 1e6 / records, 3),
+        "written_per_second": round(records / written),
+    }
+
+def bench_punch(args):
+    try:
+        from keypunch_emulator import KeypunchEmulator
+    except ImportError as e:
+        return {"error": f"No keypunch emulator: {e}"}
+    from CDto029b import punch_file
+    from punch_metrics import JobMetrics
+
+    deck = synthetic_deck(args.punch_cards)
+    results = {}
+    for window in args.windows:
+        with KeypunchEmulator(speed = 0) as emulator:
+            metrics = JobMetrics()
+            start = time.perf_counter()
+            report, aborted, _ = punch_file(deck, range = (1, args.punch_cards), punch_all = True, port = emulator.port,
+                                            window = window, journal = False, metrics = metrics)
+            elapsed = time.perf_counter() - start
+        results[f"window_{window}"] = {
+            "cards": metrics.cards,
+            "aborted": aborted,
+            "elapsed": round(elapsed, 3),
+            "punch_elapsed": round(metrics.elapsed, 3),
+            "us_per_card": round(metrics.elapsed * 1e6 / max(1, metrics.cards), 1),
+            "cards_per_minute": round(metrics.cards_per_minute),
+            "ack_latency": metrics.ack_latency.summary(),
+            "write_time": metrics.write_time.summary(),
+        }
+    return results
+
+kBenchmarks = {
+    "startup": bench_startup,
+    "readers": bench_readers,
+    "select": bench_select,
+    "log": bench_log,
+    "punch": bench_punch,
+}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd = kRepoDir, capture_output = True, text = True).stdout.strip() or None
+    except OSError:
+        return None
+
+def max_rss_bytes():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return rss if sys.platform == "darwin" else rss * 1024
+    except ImportError:
+        return None
+
+# Numbers of two results with the same path, as new / old
+def _compare(old, new, path = ""):
+    lines = []
+    if isinstance(new, dict):
+        for key, value in new.items():
+            if isinstance(old, dict) and key in old:
+                lines += _compare(old[key], value, f"{path}.{key}" if path else key)
+    elif isinstance(new, (int, float)) and isinstance(old, (int, float)) and not isinstance(new, bool) and old:
+        lines.append(f"{path}: {old:g} -> {new:g} ({new / old:.2f}x)")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark the 029 puncher software with no punch attached")
+    parser.add_argument("benchmarks", nargs = "*", help = f"benchmarks to run: {', '.join(kBenchmarks)} (default: all)")
+    parser.add_argument("--cards", default = ",".join(str(n) for n in kDeckSizes), help = "sizes of the synthetic decks")
+    parser.add_argument("--punch-cards", type = int, default = kPunchCards, help = "cards punched on the emulator")
+    parser.add_argument("--windows", default = ",".join(str(n) for n in kPunchWindows), help = "send windows of the punch benchmark")
+    parser.add_argument("--log-records", type = int, default = kLogRecords, help = "records of the log benchmark")
+    parser.add_argument("--repeat", type = int, default = kRepeat, help = "runs of every measure")
+    parser.add_argument("--output", help = "JSON file for the results")
+    parser.add_argument("--compare", help = "JSON results of a previous run to compare with")
+    parser.add_argument("--clean", action = "store_true", help = "delete the synthetic decks and logs when done")
+    args = parser.parse_args()
+    args.cards = [int(n) for n in args.cards.split(",")]
+    args.windows = [int(n) for n in args.windows.split(",")]
+    for name in args.benchmarks:
+        if name not in kBenchmarks:
+            parser.error(f"unknown benchmark {name}")
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    results = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": {},
+    }
+
+    # Logs, metrics and indexes of the benchmark stay in the bench folder
+    os.makedirs(kBenchDir, exist_ok = True)
+    os.chdir(kBenchDir)
+    # and so do the settings and caches (the baud rates negotiated with the
+    # emulator ports), the user settings are neither read nor written
+    import settings
+    import punch_journal
+    settings.kSettingsDir = os.path.join(kBenchDir, "settings")
+    settings.kSettingsFile = os.path.join(settings.kSettingsDir, "settings.json")
+    punch_journal.kJournalDir = os.path.join(settings.kSettingsDir, "journal")
+
+    for name in args.benchmarks or kBenchmarks:
+        print(f"Running {name}...", flush = True)
+        # The punch engine output is not part of the measure
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results["benchmarks"][name] = kBenchmarks[name](args)
+    results["max_rss_bytes"] = max_rss_bytes()
+
+    text = json.dumps(results, indent = 2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+
+    if compare:
+        with open(compare) as f:
+            old = json.load(f)
+        print(f"\nCompared with {old.get('commit')} ({old.get('time')}):")
+        print("\n".join(_compare(old.get("benchmarks", {}), results["benchmarks"], "")))
+
+    if args.clean:
+        os.chdir(kRepoDir)
+        shutil.rmtree(kBenchDir, ignore_errors = True)
+
+if __name__ == "__main__":
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        print("\nProgram Interrupted.")
+        sys.exit(1)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# card_index.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Card index of a deck: the byte offset of every row, kept in a sidecar file
+# next to the deck (deck.cd.idx). It gives the number of rows without reading
+# the deck and lets the punch seek straight to the first row of a range.
+# The newlines are found with numpy over the memory-mapped deck when numpy is
+# installed. The index is rebuilt when the size, the modification time or the
+# hash of the first and last blocks of the deck change.
+
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import threading
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+kIndexExt = ".idx"
+kIndexMagic = b"029IDX1\n"
+kIndexHeader = struct.Struct("<8sQQ32sQ")   # magic, size, mtime_ns, hash, rows
+kHashBlock = 1 << 16
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Hash of the size and the first and last blocks: catches a deck rewritten
+# with the same size and time without reading it all
+def quick_hash(f, size):
+    h = hashlib.sha256(struct.pack("<Q", size))
+    f.seek(0)
+    h.update(f.read(kHashBlock))
+    if size > kHashBlock:
+        f.seek(max(kHashBlock, size - kHashBlock))
+        h.update(f.read(kHashBlock))
+    return h.digest()
+
+# Offsets of the rows of the deck open in f
+def scan_offsets(f, size):
+    if size == 0:
+        return array("Q")
+
+    with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        if np is not None:
+            data = np.frombuffer(mm, dtype = np.uint8)
+            starts = np.flatnonzero(data == 0x0A) + 1
+            del data
+            offsets = array("Q", [0])
+            offsets.frombytes(starts[starts < size].astype(np.uint64).tobytes())
+            return offsets
+
+        offsets = array("Q", [0])
+        pos = mm.find(b"\n")
+        while pos >= 0 and pos + 1 < size:
+            offsets.append(pos + 1)
+            pos = mm.find(b"\n", pos + 1)
+        return offsets
+
+class CardIndex:
+    def __init__(self, file_path, offsets, size, mtime_ns, hash):
+        self.file_path = file_path
+        self.offsets = offsets
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.hash = hash
+
+    @property
+    def rows(self):
+        return len(self.offsets)
+
+    # Byte offset of row (the first row is 1)
+    def offset(self, row):
+        if row > self.rows:
+            return self.size
+        return self.offsets[row - 1]
+
+def _index_path(file_path):
+    return file_path + kIndexExt
+
+def _read_index(file_path, size, mtime_ns, hash):
+    try:
+        with open(_index_path(file_path), "rb") as f:
+            header = f.read(kIndexHeader.size)
+            magic, idx_size, idx_mtime, idx_hash, rows = kIndexHeader.unpack(header)
+            if (magic, idx_size, idx_mtime, idx_hash) != (kIndexMagic, size, mtime_ns, hash):
+                return None
+            offsets = array("Q")
+            offsets.frombytes(f.read(rows * offsets.itemsize))
+            if len(offsets) != rows:
+                return None
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            return offsets
+    except (OSError, struct.error):
+        return None
+
+def _write_index(file_path, index):
+    offsets = array("Q", index.offsets)
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    tmp_path = f"{_index_path(file_path)}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(kIndexHeader.pack(kIndexMagic, index.size, index.mtime_ns, index.hash, index.rows))
+            f.write(offsets.tobytes())
+        os.replace(tmp_path, _index_path(file_path))
+    except OSError:
+        # Read-only folder: the index stays in memory only
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+# Index of the deck, from the memory cache, the sidecar file or a new scan
+def card_index(file_path):
+    file_path = os.path.abspath(file_path)
+    with open(file_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        size, mtime_ns = st.st_size, st.st_mtime_ns
+
+        with _cache_lock:
+            index = _cache.get(file_path)
+        if index is not None and (index.size, index.mtime_ns) == (size, mtime_ns):
+            return index
+
+        hash = quick_hash(f, size)
+        offsets = _read_index(file_path, size, mtime_ns, hash)
+        if offsets is None:
+            offsets = scan_offsets(f, size)
+            index = CardIndex(file_path, offsets, size, mtime_ns, hash)
+            _write_index(file_path, index)
+        else:
+            index = CardIndex(file_path, offsets, size, mtime_ns, hash)
+
+    with _cache_lock:
+        _cache[file_path] = index
+    return index
+
+# Drop the index of the deck from memory, and its sidecar file if sidecar
+def forget_index(file_path, sidecar = False):
+    file_path = os.path.abspath(file_path)
+    with _cache_lock:
+        _cache.pop(file_path, None)
+    if sidecar:
+        try:
+            os.remove(_index_path(file_path))
+        except OSError:
+            pass
+
+# Number of rows (cards) in the deck
+def count_rows(file_path):
+    return card_index(file_path).rows
+
+if __name__ == "__main__":
+    for file_path in sys.argv[1:]:
+        index = card_index(file_path)
+        print(f"{file_path}: {index.rows} rows")
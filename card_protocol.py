@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# card_protocol.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Wire protocols between the PC and the Arduino.
+#
+# Text protocol (always available): the PC sends "data<card>\n" per card and
+# "eoj\n" at the end, the firmware answers one line per card ("ERROR ..." on
+# failure) and one line to the EOJ.
+#
+# Binary protocol (negotiated): the firmware lists "BIN" in a "CAPS=" token of
+# its start reply, the PC sends "proto bin\n" and waits for "OK BIN". From then
+# on both sides exchange frames:
+#
+#   COBS(type | seq (2 bytes, big endian) | len | payload (len bytes) | CRC16) | 0x00
+#
+# The CRC16 (CCITT, init 0xFFFF) covers type, seq, len and payload. COBS
+# encoding keeps 0x00 out of the frame, so a corrupted frame never hides the
+# start of the next one and the overhead is a fixed 2 bytes per card.
+# PC -> Arduino:  D card data, E end of job, Q query last punched card
+# Arduino -> PC:  A card punched, R punch error (payload = message),
+#                 N frame received corrupted (resend from seq), E EOJ done
+# Acks are cumulative: an ack for seq acknowledges every earlier card too.
+#
+# Baud rate (negotiated before the protocol): the firmware lists "BAUD" in its
+# capabilities, the PC sends "baud <rate>\n", the firmware answers "OK BAUD
+# <rate>" and both switch. The PC verifies the link with "ping\n" -> "pong";
+# without a valid ping within kBaudRevertTime the firmware goes back to the
+# start rate, so a failed probe never leaves the two sides out of sync.
+# The rate that worked is remembered per port to be tried first next time.
+
+import time
+import struct
+import binascii
+from settings import get_setting, set_setting
+
+kEOF = 0x00
+kHeaderSize = 4     # type, seq, len
+kCrcSize = 2
+kMaxPayload = 255
+
+kFrameCard = ord("D")
+kFrameEoj = ord("E")
+kFrameQuery = ord("Q")
+kFrameAck = ord("A")
+kFrameError = ord("R")
+kFrameNak = ord("N")
+
+# Reply kinds
+kReplyAck = "ack"
+kReplyError = "error"
+kReplyNak = "nak"
+kReplyEoj = "eoj"
+kReplyCorrupt = "corrupt"
+
+kNegotiationTimeout = 2.0 # seconds
+
+kStartBaudRate = 9600
+kBaudRates = (115200, 57600, 38400, 19200)
+kBaudSettleTime = 0.05  # seconds, after switching rate
+kBaudRevertTime = 1.0   # seconds, firmware reverts without a ping
+
+def crc16(data: bytes) -> int:
+    return binascii.crc_hqx(data, 0xFFFF)
+
+# Consistent Overhead Byte Stuffing: removes every 0x00 from data
+def cobs_encode(data: bytes) -> bytes:
+    out = bytearray()
+    for block in data.split(b"\x00"):
+        while len(block) >= 0xFE:
+            out.append(0xFF)
+            out += block[:0xFE]
+            block = block[0xFE:]
+        out.append(len(block) + 1)
+        out += block
+    return bytes(out)
+
+def cobs_decode(data: bytes) -> bytes:
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        code = data[i]
+        i += 1
+        if code == 0 or i + code - 1 > len(data):
+            raise ValueError("Invalid COBS data")
+        out += data[i:i + code - 1]
+        i += code - 1
+        if code < 0xFF and i < len(data):
+            out.append(0)
+    return bytes(out)
+
+def encode_frame(frame_type: int, seq: int, payload: bytes = b"") -> bytes:
+    if len(payload) > kMaxPayload:
+        raise ValueError(f"Frame payload too long: {len(payload)} bytes")
+    body = struct.pack(">BHB", frame_type, seq & 0xFFFF, len(payload)) + payload
+    return cobs_encode(body + struct.pack(">H", crc16(body))) + bytes([kEOF])
+
+# Parse the capabilities advertised in the start reply, i.e. "... CAPS=BIN,BAUD"
+def parse_caps(start_reply: str) -> set:
+    for token in start_reply.split():
+        if token.upper().startswith("CAPS="):
+            return {c.strip().upper() for c in token[5:].split(",") if c.strip()}
+    return set()
+
+class Reply:
+    def __init__(self, kind, seq = None, text = ""):
+        self.kind = kind
+        self.seq = seq
+        self.text = text
+
+    def __repr__(self):
+        return f"Reply({self.kind}, {self.seq}, {self.text!r})"
+
+# Incremental frame parser, a corrupted frame is reported as (None, None, raw)
+class FrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def reset(self):
+        self.buffer.clear()
+
+    def feed(self, data: bytes) -> list:
+        self.buffer += data
+        frames = []
+        while True:
+            end = self.buffer.find(kEOF)
+            if end < 0:
+                break
+            raw = bytes(self.buffer[:end])
+            del self.buffer[:end + 1]
+            if raw:
+                frames.append(self.decode(raw))
+        return frames
+
+    @staticmethod
+    def decode(raw: bytes):
+        try:
+            frame = cobs_decode(raw)
+        except ValueError:
+            return (None, None, raw)
+        if len(frame) < kHeaderSize + kCrcSize:
+            return (None, None, raw)
+        frame_type, seq, length = struct.unpack(">BHB", frame[:kHeaderSize])
+        body = frame[:-kCrcSize]
+        (crc,) = struct.unpack(">H", frame[-kCrcSize:])
+        if len(body) != kHeaderSize + length or crc != crc16(body):
+            return (None, None, raw)
+        return (frame_type, seq, body[kHeaderSize:])
+
+# The protocols only encode and parse, the engine does the I/O
+class TextProtocol:
+    name = "text"
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    # Drop a partial reply left by the previous job
+    def reset(self):
+        self.buffer.clear()
+
+    def encode_card(self, seq, line):
+        return ("data" + line.rstrip("\r\n") + "\n").encode('utf-8')
+
+    def encode_eoj(self, seq = 0):
+        return "eoj\n".encode('utf-8')
+
+    # Nothing to ask in text mode
+    def encode_query(self, seq = 0):
+        return b""
+
+    # Returns the complete replies received so far
+    def feed(self, data):
+        self.buffer += data
+        replies = []
+        while True:
+            end = self.buffer.find(b"\n")
+            if end < 0:
+                break
+            msg = bytes(self.buffer[:end + 1])
+            del self.buffer[:end + 1]
+            try:
+                text = msg.decode('utf-8')
+            except UnicodeDecodeError:
+                replies.append(Reply(kReplyCorrupt, text = repr(msg)))
+                continue
+            if "ERROR" in text:
+                replies.append(Reply(kReplyError, text = text))
+            else:
+                replies.append(Reply(kReplyAck, text = text))
+        return replies
+
+class BinaryProtocol:
+    name = "binary"
+
+    def __init__(self):
+        self.decoder = FrameDecoder()
+
+    # Drop a partial frame left by the previous job
+    def reset(self):
+        self.decoder.reset()
+
+    def encode_card(self, seq, line):
+        return encode_frame(kFrameCard, seq, line.rstrip("\r\n").encode('utf-8'))
+
+    def encode_eoj(self, seq = 0):
+        return encode_frame(kFrameEoj, seq)
+
+    # Ask the firmware to repeat the ack of the last card punched
+    def encode_query(self, seq = 0):
+        return encode_frame(kFrameQuery, seq)
+
+    # Returns the complete replies received so far
+    def feed(self, data):
+        replies = []
+        for frame_type, seq, payload in self.decoder.feed(data):
+            text = payload.decode('utf-8', errors = 'replace')
+            if frame_type == kFrameAck:
+                replies.append(Reply(kReplyAck, seq, text))
+            elif frame_type == kFrameError:
+                replies.append(Reply(kReplyError, seq, text))
+            elif frame_type == kFrameNak:
+                replies.append(Reply(kReplyNak, seq, text))
+            elif frame_type == kFrameEoj:
+                replies.append(Reply(kReplyEoj, seq, text))
+            else:
+                replies.append(Reply(kReplyCorrupt, seq, repr(payload)))
+        return replies
+
+# Switch to the highest baud rate that passes the ping probe.
+# Returns the baud rate in use.
+def negotiate_baud(ser, start_reply, port, max_baud = kBaudRates[0], log = None):
+    start_rate = ser.baudrate
+    if not max_baud or max_baud <= start_rate or "BAUD" not in parse_caps(start_reply):
+        return start_rate
+
+    cache = get_setting("baud_rates", {})
+    cached = cache.get(port)
+    rates = [r for r in kBaudRates if start_rate < r <= max_baud]
+    if cached in rates:
+        # Try the rate that worked last time first
+        rates.remove(cached)
+        rates.insert(0, cached)
+
+    timeout = ser.timeout
+    ser.timeout = kNegotiationTimeout
+    try:
+        for rate in rates:
+            ser.reset_input_buffer()
+            ser.write(f"baud {rate}\n".encode('utf-8'))
+            reply = ser.readline().decode('utf-8', errors = 'replace').strip()
+            if reply != f"OK BAUD {rate}":
+                # Firmware refused the rate and stays at the current one
+                if log:
+                    log(f"Baud rate {rate} refused ({reply or 'no reply'})")
+                continue
+
+            ser.baudrate = rate
+            time.sleep(kBaudSettleTime)
+            ser.reset_input_buffer()
+            ser.write("ping\n".encode('utf-8'))
+            reply = ser.readline().decode('utf-8', errors = 'replace').strip()
+            if reply == "pong":
+                if cached != rate:
+                    cache[port] = rate
+                    set_setting("baud_rates", cache)
+                return rate
+
+            # Probe failed, wait for the firmware to go back to the start rate
+            if log:
+                log(f"Baud rate {rate} failed the probe, falling back")
+            ser.baudrate = start_rate
+            time.sleep(kBaudRevertTime)
+            ser.reset_input_buffer()
+    finally:
+        ser.timeout = timeout
+
+    if cached is not None:
+        cache.pop(port, None)
+        set_setting("baud_rates", cache)
+    return start_rate
+
+# Switch to the binary protocol when the firmware supports it.
+# Returns the protocol to use for the cards.
+def negotiate_protocol(ser, start_reply, binary = True, log = None):
+    if not binary or "BIN" not in parse_caps(start_reply):
+        return TextProtocol()
+
+    timeout = ser.timeout
+    ser.timeout = kNegotiationTimeout
+    try:
+        ser.write("proto bin\n".encode('utf-8'))
+        reply = ser.readline().decode('utf-8', errors = 'replace').strip()
+    finally:
+        ser.timeout = timeout
+
+    if reply == "OK BIN":
+        return BinaryProtocol()
+
+    if log:
+        log(f"Binary protocol refused ({reply or 'no reply'}), using text protocol")
+    return TextProtocol()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# deck_follow.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Follow mode: punch a deck while it is still being written, like tail -f.
+# The deck is watched with inotify on Linux (by stat polling elsewhere) and
+# only the bytes added since the last read are read; every complete new line
+# is a card. Following ends at the end marker line, if any, or when the deck
+# did not grow for the idle timeout.
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import asyncio
+
+kFollowIdleTimeout = 60.0   # seconds without new cards to end following
+kFollowPollInterval = 0.5   # seconds, stat polling where there is no inotify
+kFollowEndMarker = None     # line that ends the deck, i.e. "*EOF*" (not punched)
+kFollowReadSize = 1 << 16
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_libc = None
+
+def _inotify_libc():
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno = True)
+            libc.inotify_init1
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+# Wakes up when the file changes, through inotify
+class InotifyWatcher:
+    def __init__(self, path):
+        libc = _inotify_libc()
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed on {path}")
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        self.loop.add_reader(self.fd, self._on_event)
+
+    def _on_event(self):
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self.changed.set()
+
+    # Wait for a change up to timeout seconds
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.changed.clear()
+
+    def close(self):
+        self.loop.remove_reader(self.fd)
+        os.close(self.fd)
+
+# Polls the file size and time where there is no inotify
+class PollWatcher:
+    def __init__(self, path):
+        self.path = path
+        self.last = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    async def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(kFollowPollInterval, max(0, deadline - time.monotonic())))
+            current = self._stat()
+            if current != self.last:
+                self.last = current
+                return
+
+    def close(self):
+        pass
+
+def file_watcher(path):
+    if _inotify_libc():
+        try:
+            return InotifyWatcher(path)
+        except OSError:
+            pass
+    return PollWatcher(path)
+
+# Yields the lines of the file from offset on, then the lines appended to it,
+# until the end marker, the idle timeout or stop_event (kFollowEndMarker and
+# kFollowIdleTimeout if None).
+async def follow_lines(file_path, offset = 0, stop_event = None, idle_timeout = None, end_marker = None, log = None):
+    idle_timeout = idle_timeout or kFollowIdleTimeout
+    end_marker = end_marker or kFollowEndMarker
+    watcher = file_watcher(file_path)
+    pending = b""
+    last_data = time.monotonic()
+
+    try:
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            while True:
+                data = f.read(kFollowReadSize)
+                if data:
+                    pending += data
+                    *lines, pending = pending.split(b"\n")
+                    for line in lines:
+                        text = line.decode('utf-8', errors = 'replace') + "\n"
+                        if end_marker is not None and text.strip() == end_marker:
+                            if log:
+                                log("End of deck marker found")
+                            return
+                        yield text
+                    # Only the time waiting for new cards counts as idle,
+                    # not the time taken to punch them
+                    last_data = time.monotonic()
+                    continue
+
+                if stop_event is not None and stop_event.is_set():
+                    return
+
+                if os.fstat(f.fileno()).st_size < f.tell():
+                    raise OSError(f"{os.path.basename(file_path)} was truncated while following it")
+
+                idle = time.monotonic() - last_data
+                if idle >= idle_timeout:
+                    if log:
+                        log(f"No new cards for {idle_timeout:g} seconds, end of deck")
+                    # The last line may have no newline
+                    if pending:
+                        yield pending.decode('utf-8', errors = 'replace') + "\n"
+                    return
+
+                # Wake up at least every poll interval to check stop_event
+                await watcher.wait(min(kFollowPollInterval, idle_timeout - idle))
+    finally:
+        watcher.close()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# deck_preview.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Preview of the cards of a deck: a table model that reads only the rows on
+# screen from the deck through its card index, so decks of any size open
+# instantly. The deck is not kept open (nor mapped): a block of rows is read
+# when needed, and the deck is indexed again when it changes on disk, so it
+# can be edited, saved or truncated while shown. The header is an 80-column ruler, the rows to punch are
+# highlighted, cards with errors are in red and selecting rows with the mouse
+# sets the range to punch.
+
+import os
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QFileSystemWatcher, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QColor, QBrush
+from PyQt5.QtWidgets import QTableView, QHeaderView, QAbstractItemView
+from card_index import card_index
+
+kPreviewColumns = 80
+kPreviewCacheRows = 2000
+kPreviewReadRows = 64       # rows read at once around the one needed
+
+# ....+....1....+....2 ... 8
+kRuler = "".join("+" if n % 10 == 5 else str(n // 10 % 10) if n % 10 == 0 else "." for n in range(1, kPreviewColumns + 1))
+
+# Shown for the control characters and tabs
+kControlChars = {c: "·" for c in range(0x20)}
+kControlChars[0x7F] = "·"
+
+class DeckModel(QAbstractTableModel):
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.file_path = None
+        self.deck_index = None
+        self.cache = OrderedDict()
+        self.range = None
+        self.error_rows = set()
+        self.range_brush = QBrush(QColor(255, 250, 205))
+        self.error_brush = QBrush(QColor(200, 0, 0))
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.reload)
+        self.reload_pending = False
+
+    def open(self, file_path):
+        self.beginResetModel()
+        self.close()
+        self.file_path = file_path
+        try:
+            self.deck_index = card_index(file_path)
+            self.watcher.addPath(file_path)
+        except OSError:
+            self.deck_index = None
+        self.endResetModel()
+
+    def close(self):
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+        self.deck_index = None
+        self.cache.clear()
+
+    # The deck changed on disk: index it again (an editor saving by renaming
+    # a new file drops it from the watcher, it is watched again)
+    def reload(self):
+        self.reload_pending = False
+        if self.file_path is None:
+            return
+        self.open(self.file_path)
+
+    # True if the deck on disk is still the one indexed
+    def _deck_unchanged(self):
+        try:
+            st = os.stat(self.file_path)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (self.deck_index.size, self.deck_index.mtime_ns)
+
+    def set_range(self, range):
+        self.range = range
+        self._rows_changed()
+
+    def set_error_rows(self, rows):
+        self.error_rows = set(rows)
+        self._rows_changed()
+
+    def _rows_changed(self):
+        if self.rowCount():
+            self.dataChanged.emit(self.createIndex(0, 0), self.createIndex(self.rowCount() - 1, 0))
+
+    # Text of a card (row starts from 1)
+    def card(self, row):
+        text = self.cache.get(row)
+        if text is not None:
+            self.cache.move_to_end(row)
+            return text
+
+        # The offsets are those of the deck indexed, the rows are shown again
+        # once the deck changed is indexed
+        if self.reload_pending or not self._deck_unchanged():
+            if not self.reload_pending:
+                self.reload_pending = True
+                QTimer.singleShot(0, self.reload)
+            return ""
+
+        first = max(1, row - kPreviewReadRows // 2)
+        last = min(self.deck_index.rows, first + kPreviewReadRows - 1)
+        start = self.deck_index.offset(first)
+        end = self.deck_index.offset(last + 1)
+        try:
+            with open(self.file_path, "rb") as f:
+                f.seek(start)
+                block = f.read(end - start)
+        except OSError:
+            return ""
+
+        for n in range(first, last + 1):
+            line = block[self.deck_index.offset(n) - start:self.deck_index.offset(n + 1) - start]
+            self.cache[n] = line.rstrip(b"\r\n").decode('utf-8', errors = 'replace')
+            self.cache.move_to_end(n)
+        while len(self.cache) > kPreviewCacheRows:
+            self.cache.popitem(last = False)
+        return self.cache[row]
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid() or self.deck_index is None:
+            return 0
+        return self.deck_index.rows
+
+    def columnCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row() + 1
+
+        if role == Qt.DisplayRole:
+            return self.card(row).translate(kControlChars)
+        if role == Qt.ToolTipRole:
+            return f"Card {row}: {len(self.card(row))} columns"
+        if role == Qt.BackgroundRole and self.range and self.range[0] <= row <= self.range[1]:
+            return self.range_brush
+        if role == Qt.ForegroundRole and row in self.error_rows:
+            return self.error_brush
+        return None
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return kRuler
+        return str(section + 1)
+
+class DeckPreview(QTableView):
+    # First and last row selected with the mouse
+    range_selected = pyqtSignal(int, int)
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.deck_model = DeckModel(self)
+        self.setModel(self.deck_model)
+
+        font = QFont("Courier")
+        font.setStyleHint(QFont.TypeWriter)
+        self.setFont(font)
+        self.horizontalHeader().setFont(font)
+        self.horizontalHeader().setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        self.horizontalHeader().setStretchLastSection(True)
+
+        # Fixed row heights: nothing is measured, only the rows on screen are read
+        vertical = self.verticalHeader()
+        vertical.setSectionResizeMode(QHeaderView.Fixed)
+        vertical.setDefaultSectionSize(self.fontMetrics().height() + 4)
+        # Highlighting the numbers of the selected rows asks the model about
+        # every row of the selection
+        vertical.setHighlightSections(False)
+        self.horizontalHeader().setHighlightSections(False)
+        self.setWordWrap(False)
+        self.setShowGrid(False)
+
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.ContiguousSelection)
+        self.selectionModel().selectionChanged.connect(self._on_selection)
+
+    def open(self, file_path):
+        self.deck_model.open(file_path)
+        self.setColumnWidth(0, self.fontMetrics().horizontalAdvance("0" * (kPreviewColumns + 2)))
+
+    def close_deck(self):
+        self.deck_model.beginResetModel()
+        self.deck_model.close()
+        self.deck_model.endResetModel()
+
+    def set_range(self, start_row, end_row):
+        self.deck_model.set_range((start_row, end_row))
+
+    def set_error_rows(self, rows):
+        self.deck_model.set_error_rows(rows)
+
+    def show_row(self, row):
+        self.scrollTo(self.deck_model.index(row - 1, 0), QAbstractItemView.PositionAtTop)
+
+    # The selection ranges, not the selected rows: a drag over 100k cards
+    # is one range
+    def _on_selection(self, selected, deselected):
+        ranges = self.selectionModel().selection()
+        if not ranges.isEmpty():
+            first = min(r.top() for r in ranges) + 1
+            last = max(r.bottom() for r in ranges) + 1
+            self.range_selected.emit(first, last)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# deck_stream.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Cards from a stream instead of a deck file: stdin, a FIFO, an open file or
+# any iterable of lines (i.e. a generator), so a converter can be piped into
+# the punch with no intermediate file:
+#   some_converter | python3 puncher.py -
+# The stream is read on a thread that stays at most kStreamBuffer cards ahead
+# of the punch; when the buffer is full it waits, and so does the producer
+# (its pipe fills up), so the memory used does not depend on the deck size.
+
+import os
+import sys
+import stat
+import asyncio
+import threading
+
+kStreamBuffer = 64          # cards read ahead of the punch
+kStreamPollInterval = 0.5   # seconds, checks stop_event while waiting for cards
+
+# True if source is a stream and not the path of a deck file ("-" is stdin)
+def is_stream(source):
+    if source == "-":
+        return True
+    if isinstance(source, (str, bytes, os.PathLike)):
+        try:
+            return stat.S_ISFIFO(os.stat(source).st_mode)
+        except OSError:
+            return False
+    return True
+
+# Name of a stream for the log
+def stream_name(source):
+    if source == "-":
+        return "<stdin>"
+    if isinstance(source, (str, bytes, os.PathLike)):
+        return os.fsdecode(source)
+    name = getattr(source, "name", None)
+    return name if isinstance(name, str) else "<stream>"
+
+# A card line as read from a deck file: str ending with a newline
+def _card_line(item):
+    if isinstance(item, bytes):
+        item = item.decode('utf-8', errors = 'replace')
+    return item.rstrip("\r\n") + "\n"
+
+# Yields the cards of source, skipping the first skip ones, until the end of
+# the stream or stop_event. source is "-" (stdin), the path of a FIFO, a file
+# object or an iterable of str or bytes lines.
+async def stream_lines(source, skip = 0, stop_event = None, buffer = None):
+    loop = asyncio.get_running_loop()
+    cards = asyncio.Queue()
+    # Free places in the buffer, the reader waits for one before every card
+    free = threading.Semaphore(buffer or kStreamBuffer)
+    closed = threading.Event()
+    end = object()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(cards.put_nowait, item)
+        except RuntimeError:
+            # The loop is closed, nobody reads the cards anymore
+            closed.set()
+
+    def read():
+        try:
+            if source == "-":
+                lines = sys.stdin
+            elif isinstance(source, (str, bytes, os.PathLike)):
+                # Blocks until the FIFO has a writer
+                lines = open(source, "r")
+            else:
+                lines = source
+            try:
+                for line in lines:
+                    while not free.acquire(timeout = kStreamPollInterval):
+                        if closed.is_set():
+                            return
+                    if closed.is_set():
+                        return
+                    put(_card_line(line))
+            finally:
+                if lines is not source and source != "-":
+                    lines.close()
+            put(end)
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target = read, name = "deck-stream", daemon = True).start()
+
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(cards.get(), kStreamPollInterval)
+            except asyncio.TimeoutError:
+                if stop_event is not None and stop_event.is_set():
+                    return
+                continue
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            free.release()
+            if skip > 0:
+                skip -= 1
+                continue
+            yield item
+    finally:
+        closed.set()
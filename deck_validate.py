@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# deck_validate.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Pre-flight check of a deck before the port is opened: cards longer than 80
+# columns, characters the 029 cannot punch, tabs and control characters,
+# lowercase letters, blank cards and mixed CRLF/LF line endings, reported by
+# card and column. With numpy every byte of the deck is classified in one
+# pass through a lookup table; the rows and columns of the offending bytes
+# come from the card index.
+
+import os
+import sys
+import mmap
+from card_index import card_index
+from hollerith import kPunchable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+kMaxColumns = 80
+kMaxIssues = 1000   # issues listed, the counts include all of them
+
+
+# Issue kinds, errors stop the punch and warnings do not
+kIssueTooLong = "too long"
+kIssueTab = "tab"
+kIssueControl = "control character"
+kIssueNotPunchable = "not punchable"
+kIssueLowercase = "lowercase"
+kIssueBlank = "blank card"
+kIssueLineEndings = "mixed line endings"
+
+kErrorKinds = (kIssueTooLong, kIssueTab, kIssueControl, kIssueNotPunchable)
+
+# Issue kind of every byte value, None if the byte is fine
+def _byte_kinds():
+    kinds = [kIssueNotPunchable] * 256
+    for c in kPunchable:
+        kinds[c] = None
+    for c in range(0x20):
+        kinds[c] = kIssueControl
+    kinds[0x7F] = kIssueControl
+    kinds[ord("\t")] = kIssueTab
+    kinds[ord("\n")] = None
+    for c in range(ord("a"), ord("z") + 1):
+        kinds[c] = kIssueLowercase
+    return kinds
+
+kByteKinds = _byte_kinds()
+kKindCodes = [None, kIssueTab, kIssueControl, kIssueNotPunchable, kIssueLowercase]
+
+class DeckIssue:
+    def __init__(self, row, column, kind, detail = ""):
+        self.row = row
+        self.column = column
+        self.kind = kind
+        self.detail = detail
+
+    @property
+    def is_error(self):
+        return self.kind in kErrorKinds
+
+    def __str__(self):
+        where = f"Card {self.row}" if self.row else "Deck"
+        if self.column:
+            where += f" column {self.column}"
+        return f"{where}: {self.kind}{f' ({self.detail})' if self.detail else ''}"
+
+class DeckReport:
+    def __init__(self, file_path, rows):
+        self.file_path = file_path
+        self.rows = rows
+        self.issues = []
+        self.counts = {}
+
+    def add(self, row, column, kind, detail = ""):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if len(self.issues) < kMaxIssues:
+            self.issues.append(DeckIssue(row, column, kind, detail))
+
+    @property
+    def errors(self):
+        return sum(count for kind, count in self.counts.items() if kind in kErrorKinds)
+
+    @property
+    def warnings(self):
+        return sum(count for kind, count in self.counts.items() if kind not in kErrorKinds)
+
+    @property
+    def ok(self):
+        return self.errors == 0
+
+    def summary(self):
+        name = os.path.basename(self.file_path)
+        if not self.counts:
+            return f"{name}: {self.rows} cards, no problems found."
+        counts = ", ".join(f"{count} {kind}" for kind, count in sorted(self.counts.items()))
+        return f"{name}: {self.rows} cards, {self.errors} error(s), {self.warnings} warning(s): {counts}."
+
+    # Summary and the first limit issues, errors first
+    def format(self, limit = 50):
+        lines = [self.summary()]
+        issues = sorted(self.issues, key = lambda issue: (not issue.is_error, issue.row or 0, issue.column or 0))
+        lines += [f"  {issue}" for issue in issues[:limit]]
+        if len(issues) > limit or len(self.issues) < sum(self.counts.values()):
+            lines.append(f"  ... {sum(self.counts.values()) - min(limit, len(issues))} more")
+        return "\n".join(lines)
+
+def _char_detail(byte):
+    return repr(chr(byte)) if byte < 0x80 else f"0x{byte:02X}"
+
+# Errors of one card (a line without its newline) as (column, kind, detail)
+# tuples, for the cards that are not read from a deck file
+def card_errors(line):
+    data = line.encode('utf-8') if isinstance(line, str) else line
+    errors = []
+    if len(data) > kMaxColumns:
+        errors.append((kMaxColumns + 1, kIssueTooLong, f"{len(data)} columns"))
+    for column, byte in enumerate(data, 1):
+        kind = kByteKinds[byte]
+        if kind in kErrorKinds:
+            errors.append((column, kind, _char_detail(byte)))
+    return errors
+
+def _validate_numpy(report, data, starts, first, last):
+    size = len(data)
+    # End of every row (position of its newline, or the end of the deck)
+    ends = np.empty(len(starts), dtype = np.int64)
+    ends[:-1] = starts[1:] - 1
+    ends[-1] = size - 1 if data[size - 1] == 0x0A else size
+    has_cr = (ends > starts) & (data[np.maximum(ends - 1, 0)] == 0x0D)
+    lengths = ends - starts - has_cr
+
+    terminated = ends < size
+    n_crlf = int((has_cr & terminated).sum())
+    n_lf = int(terminated.sum()) - n_crlf
+    if n_crlf and n_lf:
+        report.add(None, None, kIssueLineEndings, f"{n_crlf} CRLF, {n_lf} LF")
+
+    rows = slice(first - 1, last)
+    for row in np.flatnonzero(lengths[rows] > kMaxColumns) + first:
+        report.add(int(row), kMaxColumns + 1, kIssueTooLong, f"{int(lengths[row - 1])} columns")
+    for row in np.flatnonzero(lengths[rows] == 0) + first:
+        report.add(int(row), None, kIssueBlank)
+
+    # Classify every byte of the rows to check in one pass
+    codes = np.zeros(256, dtype = np.uint8)
+    for byte, kind in enumerate(kByteKinds):
+        codes[byte] = kKindCodes.index(kind)
+    lo = int(starts[first - 1])
+    hi = int(ends[last - 1])
+    byte_codes = codes[data[lo:hi]]
+    # The CR of CRLF is part of the line ending
+    cr = (ends[rows] - 1)[has_cr[rows]] - lo
+    byte_codes[cr] = 0
+
+    positions = np.flatnonzero(byte_codes) + lo
+    if len(positions):
+        issue_rows = np.searchsorted(starts, positions, side = "right")
+        columns = positions - starts[issue_rows - 1] + 1
+        for position, row, column in zip(positions[:kMaxIssues].tolist(), issue_rows[:kMaxIssues].tolist(), columns[:kMaxIssues].tolist()):
+            report.add(row, column, kKindCodes[byte_codes[position - lo]], _char_detail(data[position]))
+        # Only counted past the listed ones
+        for code in np.unique(byte_codes[positions[kMaxIssues:] - lo]).tolist():
+            report.counts[kKindCodes[code]] = report.counts.get(kKindCodes[code], 0) + int((byte_codes[positions[kMaxIssues:] - lo] == code).sum())
+
+def _validate_python(report, data, offsets, first, last):
+    size = len(data)
+    n_crlf = n_lf = 0
+    for row in range(1, len(offsets) + 1):
+        start = offsets[row - 1]
+        end = offsets[row] - 1 if row < len(offsets) else (size - 1 if data[size - 1] == 0x0A else size)
+        has_cr = end > start and data[end - 1] == 0x0D
+        if end < size:
+            if has_cr:
+                n_crlf += 1
+            else:
+                n_lf += 1
+        if not (first <= row <= last):
+            continue
+
+        line = data[start:end - 1 if has_cr else end]
+        if len(line) > kMaxColumns:
+            report.add(row, kMaxColumns + 1, kIssueTooLong, f"{len(line)} columns")
+        if not line:
+            report.add(row, None, kIssueBlank)
+        for column, byte in enumerate(line, 1):
+            kind = kByteKinds[byte]
+            if kind:
+                report.add(row, column, kind, _char_detail(byte))
+
+    if n_crlf and n_lf:
+        report.issues.insert(0, DeckIssue(None, None, kIssueLineEndings, f"{n_crlf} CRLF, {n_lf} LF"))
+        report.counts[kIssueLineEndings] = 1
+
+# Check the rows in range of the deck (all of them if None)
+def validate_deck(file_path, range = None):
+    index = card_index(file_path)
+    report = DeckReport(file_path, index.rows)
+    if index.rows == 0:
+        return report
+
+    first, last = range or (1, index.rows)
+    first, last = max(1, first), min(last, index.rows)
+    if first > last:
+        return report
+
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            if np is not None:
+                data = np.frombuffer(mm, dtype = np.uint8)
+                starts = np.frombuffer(index.offsets, dtype = np.uint64).astype(np.int64)
+                try:
+                    _validate_numpy(report, data, starts, first, last)
+                finally:
+                    del data
+            else:
+                _validate_python(report, mm, index.offsets, first, last)
+    return report
+
+if __name__ == "__main__":
+    status = 0
+    for file_path in sys.argv[1:]:
+        report = validate_deck(file_path)
+        print(report.format())
+        if not report.ok:
+            status = 1
+    sys.exit(status)
@@ -6,14 +6,26 @@
 
 import os
 import re
+import json
+import codecs
 import argparse
 import sys
 import subprocess
 from typing import Dict, Any, Optional
 from typing import List
 
-def _git(*args: str, cwd: Optional[str] = None) -> str:
-    return subprocess.check_output(["git", *args], cwd = cwd, stderr = subprocess.STDOUT).decode().strip()
+# Never wait for a password prompt nobody will answer
+kGitEnv = dict(os.environ, GIT_TERMINAL_PROMPT = "0")
+
+def _git(*args: str, cwd: Optional[str] = None, timeout: Optional[float] = None) -> str:
+    return subprocess.check_output(["git", *args], cwd = cwd, stderr = subprocess.STDOUT, env = kGitEnv, timeout = timeout).decode().strip()
+
+# URL of the origin remote, None if there is none
+def remote_url(repo_dir: Optional[str] = None) -> Optional[str]:
+    try:
+        return _git("config", "--get", "remote.origin.url", cwd = repo_dir) or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
 
 def _status_to_term(code: str) -> str:
     first = code[:1]  # handle cases like R100 or C85
@@ -37,13 +49,80 @@ def _status_to_term(code: str) -> str:
         return "Broken"
     return code
     
+# One commit of the git log output below: the fields, then the name-status
+# entries separated by NULs ("M", path or "R100", old path, new path)
+def _parse_commit(record: str) -> Optional[Dict[str, Any]]:
+    parts = record.split("\x1f", 4)
+    if len(parts) < 5:
+        return None
+    hash, author, date, body, changes = parts
+
+    files: List[Dict[str, str]] = []
+    tokens = [token for token in changes.lstrip("\n").split("\0") if token]
+    index = 0
+    while index < len(tokens):
+        status = tokens[index]
+        if status[:1] in ("R", "C") and index + 2 < len(tokens):
+            files.append({"status": _status_to_term(status), "old_path": tokens[index + 1], "path": tokens[index + 2]})
+            index += 3
+        elif index + 1 < len(tokens):
+            files.append({"status": _status_to_term(status), "path": tokens[index + 1]})
+            index += 2
+        else:
+            break
+
+    return {
+        "hash": hash,
+        "author": author,
+        "date": date,
+        "subject": re.sub(r"\n{2,}", "\n", body).strip(),
+        "files": files
+    }
+
+# Commits of rev_range with their changed files, from a single git log whose
+# output is parsed while it streams
+def iter_commits(rev_range: str, cwd: Optional[str] = None):
+    process = subprocess.Popen(
+        ["git", "log", "--name-status", "-z", "--date=iso-strict",
+         "--pretty=format:%x1e%H%x1f%an%x1f%ad%x1f%B%x1f", rev_range],
+        cwd = cwd,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.DEVNULL
+    )
+    # A chunk can end inside a UTF-8 character
+    decoder = codecs.getincrementaldecoder("utf-8")(errors = "replace")
+    buffer = ""
+    try:
+        while True:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                break
+            buffer += decoder.decode(chunk)
+            # Every record before the last one is complete
+            *records, buffer = buffer.split("\x1e")
+            for record in records:
+                commit = _parse_commit(record)
+                if commit:
+                    yield commit
+        commit = _parse_commit(buffer + decoder.decode(b"", final = True))
+        if commit:
+            yield commit
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+
 # Check for updates in the given Git repo directory and optionally update it.
-# Returns a dict with keys: inside_repo, branch, upstream, ahead, behind, dirty, updated, msg, commits.
+# Unless fetch is False the remote is fetched first (giving up after
+# fetch_timeout seconds); if the fetch fails the repo is compared with the
+# upstream commits fetched before.
+# Returns a dict with keys: inside_repo, branch, upstream, ahead, behind, dirty, updated, msg, commits,
+# fetched, fetch_error.
 # ------------------------------------------------------------------------------
-def git_check_update(*, repo_dir: Optional[str] = None, do_update: bool = False) -> Dict[str, Any]:
+def git_check_update(*, repo_dir: Optional[str] = None, do_update: bool = False, fetch: bool = True,
+                     fetch_timeout: Optional[float] = None) -> Dict[str, Any]:
 
-    remote_url = _git("config", "--get", "remote.origin.url", cwd = repo_dir)
-    print(f"Checking git repository {remote_url} ...")
+    print(f"Checking git repository {remote_url(repo_dir)} ...")
 
     try:
         inside = _git("rev-parse", "--is-inside-work-tree", cwd = repo_dir) == "true"
@@ -51,11 +130,12 @@ def git_check_update(*, repo_dir: Optional[str] = None, do_update: bool = False)
         return {
             "inside_repo": False,
             "updated": False,
-            "msg": e.output.decode().strip() if hasattr(e, "output") else str(e)
+            "msg": e.output.decode().strip() if hasattr(e, "output") else str(e),
+            "commits": []
         }
 
     if not inside:
-        return {"inside_repo": False, "updated": False, "msg": "Not a git repo"}
+        return {"inside_repo": False, "updated": False, "msg": "Not a git repo", "commits": []}
 
     def safe_git(args):
         try:
@@ -67,16 +147,16 @@ def git_check_update(*, repo_dir: Optional[str] = None, do_update: bool = False)
     upstream = safe_git(["rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}"])
 
     # fetch
-    try:
-        _git("fetch", "--all", "--prune", cwd = repo_dir)
-    except subprocess.CalledProcessError as e:
-        return {
-            "inside_repo": True,
-            "branch": branch,
-            "upstream": upstream or None,
-            "updated": False,
-            "msg": e.output.decode().strip()
-        }
+    fetched = False
+    fetch_error = None
+    if fetch:
+        try:
+            _git("fetch", "--all", "--prune", cwd = repo_dir, timeout = fetch_timeout)
+            fetched = True
+        except subprocess.CalledProcessError as e:
+            fetch_error = e.output.decode().strip()
+        except subprocess.TimeoutExpired:
+            fetch_error = f"git fetch timed out after {fetch_timeout:g} seconds"
 
     # ahead/behind versus upstream
     ahead = behind = None
@@ -104,62 +184,8 @@ def git_check_update(*, repo_dir: Optional[str] = None, do_update: bool = False)
     commits: List[Dict[str, str]] = []
     if upstream and behind and behind > 0:
         try:
-            raw = _git(
-                "log",
-                "--pretty=format:%H%x1f%an%x1f%ad%x1f%B%x1e",
-                "--date=iso-strict",
-                "HEAD..@{u}",
-                cwd = repo_dir
-            )
-            for entry in raw.split("\x1e"):
-                if not entry.strip():
-                    continue
-                parts = entry.strip().split("\x1f", 3)
-                if len(parts) == 4:
-                    message = re.sub(r"\n{2,}", "\n", parts[3]).strip()
-                    files_raw = _git(
-                        "show",
-                        "--pretty=format:",
-                        "--name-status",
-                        parts[0],
-                        cwd = repo_dir
-                    )
-                    files: List[Dict[str, str]] = []
-                    for line in files_raw.splitlines():
-                        if not line.strip():
-                            continue
-                        cols = line.split("\t")
-                        if len(cols) == 2:
-                            status, path = cols
-                            status_term = _status_to_term(status)
-                            files.append(
-                                {
-                                    "status": status_term,
-                                    "path": path
-                                }
-                            )
-                        elif len(cols) >= 3:
-                            status = cols[0]
-                            old_path = cols[1]
-                            new_path = cols[2]
-                            status_term = _status_to_term(status)
-                            files.append(
-                                {
-                                    "status": status_term,
-                                    "old_path": old_path,
-                                    "path": new_path
-                                }
-                            )
-                    commits.append(
-                        {
-                            "hash": parts[0],
-                            "author": parts[1],
-                            "date": parts[2],
-                            "subject": message,
-                            "files": files
-                        }
-                    )
-        except subprocess.CalledProcessError:
+            commits = list(iter_commits("HEAD..@{u}", cwd = repo_dir))
+        except (OSError, subprocess.CalledProcessError):
             commits = []
 
     updated = False
@@ -180,6 +206,9 @@ def git_check_update(*, repo_dir: Optional[str] = None, do_update: bool = False)
         else:
             msg = "Up to date"
 
+    if updated:
+        refresh_git_version()
+
     return {
         "inside_repo": True,
         "branch": branch,
@@ -190,12 +219,64 @@ def git_check_update(*, repo_dir: Optional[str] = None, do_update: bool = False)
         "updated": updated,
         "msg": msg,
         "commits": commits,
+        "fetched": fetched,
+        "fetch_error": fetch_error,
     }
 
+kRepoDir = os.path.dirname(os.path.abspath(__file__))
+kVersionFile = "029-puncher-version.json"   # in the .git folder, never committed
+
+_version = None
+
+# The .git folder of the repo (a worktree has a .git file pointing to it)
+def git_dir(repo_dir: str = kRepoDir) -> Optional[str]:
+    path = os.path.join(repo_dir, ".git")
+    if os.path.isfile(path):
+        try:
+            with open(path, "r") as f:
+                line = f.read().strip()
+            if line.startswith("gitdir:"):
+                path = os.path.join(repo_dir, line[len("gitdir:"):].strip())
+        except OSError:
+            return None
+    return path if os.path.isdir(path) else None
+
+# Commit of HEAD read from the files in .git, without running git
+def read_head(repo_dir: str = kRepoDir) -> Optional[str]:
+    path = git_dir(repo_dir)
+    if path is None:
+        return None
+    try:
+        with open(os.path.join(path, "HEAD"), "r") as f:
+            head = f.read().strip()
+        if not head.startswith("ref:"):
+            return head
+        ref = head[len("ref:"):].strip()
+
+        # The refs of a worktree are in the main .git folder
+        common = path
+        if os.path.isfile(os.path.join(path, "commondir")):
+            with open(os.path.join(path, "commondir"), "r") as f:
+                common = os.path.join(path, f.read().strip())
+
+        for folder in (path, common):
+            ref_path = os.path.join(folder, ref)
+            if os.path.isfile(ref_path):
+                with open(ref_path, "r") as f:
+                    return f.read().strip()
+        with open(os.path.join(common, "packed-refs"), "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
 def get_git_tag():
     version = None
     try:
-        git_output = subprocess.check_output(["git", "describe", "--tags", "--always"], stderr = subprocess.DEVNULL)
+        git_output = subprocess.check_output(["git", "describe", "--tags", "--always"], cwd = kRepoDir, stderr = subprocess.DEVNULL)
         tag = git_output.strip().decode()
         
     except Exception:
@@ -206,7 +287,7 @@ def get_git_tag():
 def get_git_count():
     count = None
     try:
-        git_output = subprocess.check_output(["git", "rev-list", "--all", "--count"], stderr = subprocess.DEVNULL)
+        git_output = subprocess.check_output(["git", "rev-list", "--all", "--count"], cwd = kRepoDir, stderr = subprocess.DEVNULL)
         count = git_output.strip().decode()
         
     except Exception:
@@ -217,15 +298,83 @@ def get_git_count():
 def get_git_date():
     date = None
     try:
-        git_output = subprocess.check_output(["git", "log", "-1", "--format=%cd", "--date=format:%d-%b-%Y %H:%M"], stderr = subprocess.DEVNULL)
+        git_output = subprocess.check_output(["git", "log", "-1", "--format=%cd", "--date=format:%d-%b-%Y %H:%M"], cwd = kRepoDir, stderr = subprocess.DEVNULL)
         date = git_output.strip().decode()
 
-    except subprocess.CalledProcessError:
+    except (OSError, subprocess.CalledProcessError):
         date = "[error getting git date]"
 
     return date
-    
+
+# Build count and date of HEAD: from the version file if it is about the
+# current HEAD, otherwise from git and written to the version file
+def _version_info(repo_dir: str = kRepoDir) -> Dict[str, Any]:
+    head = read_head(repo_dir)
+    path = git_dir(repo_dir)
+    version_file = os.path.join(path, kVersionFile) if path else None
+
+    if head and version_file:
+        try:
+            with open(version_file, "r", encoding = "utf-8") as f:
+                info = json.load(f)
+            if info.get("head") == head:
+                return info
+        except (OSError, ValueError):
+            pass
+
+    info = {"head": head, "count": get_git_count(), "date": get_git_date()}
+    if head and version_file and not info["count"].startswith("[") and not info["date"].startswith("["):
+        try:
+            with open(version_file, "w", encoding = "utf-8") as f:
+                json.dump(info, f)
+        except OSError:
+            pass
+    return info
+
+# Version of the program, resolved once per process
 def get_git_version():
-    count = get_git_count()
-    date = get_git_date()
-    return f"1.0 (build {count} - {date})"
+    global _version
+    if _version is None:
+        info = _version_info()
+        _version = f"1.0 (build {info['count']} - {info['date']})"
+    return _version
+
+# Resolve the version again after an update, and write it to the version
+# file for the program restarted after the update
+def refresh_git_version():
+    global _version
+    _version = None
+    return get_git_version()
+
+# Command line: check and optionally update the repo (also git_update.py)
+def update_main():
+    parser = argparse.ArgumentParser(description = "Check and optionally update a git repo.")
+    parser.add_argument(
+        "--update",
+        action = "store_true",
+        help = "Perform update if behind"
+    )
+    parser.add_argument(
+        "--repo-dir",
+        default = None,
+        help = "Path to repo (default: current directory)"
+    )
+    args = parser.parse_args()
+
+    try:
+        print("Checking git repo")
+        info = git_check_update(repo_dir = args.repo_dir, do_update = args.update)
+        print(info)
+        
+        if info["updated"]:
+            print("Program updated. Restarting...")
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+                
+        sys.exit(0)
+        
+    except KeyboardInterrupt:
+        print("\nProgram Interrupted.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    update_main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# hollerith.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Hollerith card code of the IBM 029 and batch encoding of decks to holes.
+# A deck becomes a (cards, 12, 80) boolean array (rows 12, 11, 0, 1 ... 9 from
+# the top of the card, columns 1 to 80) with one table lookup, or bit-packed
+# to (cards, 2, 80) bytes. The holes can be counted per card and per column
+# and decoded back to text. Lowercase letters are punched as uppercase, as
+# the 029 keyboard does.
+
+import sys
+import mmap
+from card_index import card_index
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+kCardRows = 12
+kCardColumns = 80
+kRowNames = ("12", "11", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9")
+
+# Punches of every character of the 029 keyboard, as row names
+kCodeTable = {
+    " ": (),
+    "&": ("12",), "-": ("11",), "/": ("0", "1"),
+    ".": ("12", "8", "3"), "<": ("12", "8", "4"), "(": ("12", "8", "5"), "+": ("12", "8", "6"), "|": ("12", "8", "7"),
+    "!": ("11", "8", "2"), "$": ("11", "8", "3"), "*": ("11", "8", "4"), ")": ("11", "8", "5"), ";": ("11", "8", "6"),
+    ",": ("0", "8", "3"), "%": ("0", "8", "4"), "_": ("0", "8", "5"), ">": ("0", "8", "6"), "?": ("0", "8", "7"),
+    ":": ("8", "2"), "#": ("8", "3"), "@": ("8", "4"), "'": ("8", "5"), "=": ("8", "6"), '"': ("8", "7"),
+    "¢": ("12", "8", "2"), "¬": ("11", "8", "7"),
+}
+for _digit in range(10):
+    kCodeTable[str(_digit)] = (str(_digit),)
+for _i, _c in enumerate("ABCDEFGHI"):
+    kCodeTable[_c] = ("12", str(_i + 1))
+for _i, _c in enumerate("JKLMNOPQR"):
+    kCodeTable[_c] = ("11", str(_i + 1))
+for _i, _c in enumerate("STUVWXYZ"):
+    kCodeTable[_c] = ("0", str(_i + 2))
+
+# The ASCII characters that can be punched
+kPunchable = "".join(c for c in kCodeTable if c.isascii()).encode('ascii')
+
+# Column of holes as a 12-bit word, row 12 is the highest bit
+def column_word(char):
+    word = 0
+    for row in kCodeTable[char]:
+        word |= 1 << (kCardRows - 1 - kRowNames.index(row))
+    return word
+
+def _tables():
+    holes = np.zeros((256, kCardRows), dtype = bool)
+    for char in kCodeTable:
+        if char.isascii():
+            for row in kCodeTable[char]:
+                holes[ord(char), kRowNames.index(row)] = True
+    # 029 keyboard: no lowercase
+    holes[ord("a"):ord("z") + 1] = holes[ord("A"):ord("Z") + 1]
+
+    # Characters of the column words, 0 where no character has that code
+    chars = np.zeros(1 << kCardRows, dtype = np.uint8)
+    for char in kCodeTable:
+        if char.isascii():
+            chars[column_word(char)] = ord(char)
+    return holes, chars
+
+if np is not None:
+    kHoleTable, kWordChars = _tables()
+    kRowWeights = (1 << np.arange(kCardRows - 1, -1, -1)).astype(np.uint16)
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("numpy is required for the Hollerith arrays")
+
+# Cards as a (cards, 80) matrix of bytes, padded with spaces. Columns past 80
+# and bytes without a code are punched as blank columns.
+def card_matrix(lines):
+    _require_numpy()
+    matrix = np.full((len(lines), kCardColumns), ord(" "), dtype = np.uint8)
+    for row, line in enumerate(lines):
+        data = line.rstrip("\r\n").encode('ascii', errors = 'replace')[:kCardColumns]
+        matrix[row, :len(data)] = np.frombuffer(data, dtype = np.uint8)
+    return matrix
+
+# Rows in range of a deck (all of them if None) as a (cards, 80) byte matrix,
+# built from the card index without a loop over the cards
+def deck_matrix(file_path, range = None):
+    _require_numpy()
+    index = card_index(file_path)
+    first, last = range or (1, index.rows)
+    first, last = max(1, first), min(last, index.rows)
+    if index.rows == 0 or first > last:
+        return np.full((0, kCardColumns), ord(" "), dtype = np.uint8)
+
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype = np.uint8)
+            try:
+                offsets = np.frombuffer(index.offsets, dtype = np.uint64).astype(np.int64)
+                starts = offsets[first - 1:last]
+                ends = np.append(offsets[first:], index.size)[:len(starts)]
+                lengths = ends - starts
+                # Not the line ending
+                last_bytes = data[np.maximum(ends - 1, 0)]
+                lengths -= (lengths > 0) & (last_bytes == 0x0A)
+                last_bytes = data[np.maximum(starts + lengths - 1, 0)]
+                lengths -= (lengths > 0) & (last_bytes == 0x0D)
+
+                columns = np.arange(kCardColumns)
+                inside = columns < np.minimum(lengths, kCardColumns)[:, None]
+                matrix = np.full((len(starts), kCardColumns), ord(" "), dtype = np.uint8)
+                matrix[inside] = data[(starts[:, None] + columns)[inside]]
+            finally:
+                del data
+    return matrix
+
+# Holes of the cards of a byte matrix: (cards, 12, 80) booleans
+def encode_matrix(matrix):
+    _require_numpy()
+    return kHoleTable[matrix].transpose(0, 2, 1)
+
+def encode_cards(lines):
+    return encode_matrix(card_matrix(lines))
+
+def encode_deck(file_path, range = None):
+    return encode_matrix(deck_matrix(file_path, range))
+
+# (cards, 12, 80) booleans <-> (cards, 2, 80) bytes
+def pack(holes):
+    return np.packbits(holes, axis = 1)
+
+def unpack(packed):
+    return np.unpackbits(packed, axis = 1, count = kCardRows).astype(bool)
+
+# Columns as 12-bit words: (cards, 80) uint16
+def column_words(holes):
+    return np.tensordot(holes.astype(np.uint16), kRowWeights, axes = ([1], [0])).astype(np.uint16)
+
+# Holes of every card
+def hole_counts(holes):
+    return holes.sum(axis = (1, 2))
+
+# Holes of every column of every card: (cards, 80)
+def column_hole_counts(holes):
+    return holes.sum(axis = 1)
+
+# Holes of the whole deck at every row and column: (12, 80)
+def column_stats(holes):
+    return holes.sum(axis = 0)
+
+# Cards of the holes, as text without the trailing blanks. A column with no
+# character of the 029 decodes as "?"
+def decode(holes):
+    chars = kWordChars[column_words(holes)]
+    chars[(chars == 0)] = ord("?")
+    return [bytes(card).decode('ascii').rstrip(" ") for card in chars]
+
+# Picture of a card, i.e. for the log
+def render_card(card_holes):
+    lines = []
+    for row in range(kCardRows):
+        marks = "".join("#" if hole else "." for hole in card_holes[row])
+        lines.append(f"{kRowNames[row]:>2} {marks}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    for file_path in sys.argv[1:]:
+        holes = encode_deck(file_path)
+        counts = hole_counts(holes)
+        print(f"{file_path}: {len(holes)} cards, {int(counts.sum())} holes, up to {int(counts.max(initial = 0))} in a card")
+        if len(holes):
+            print(render_card(holes[0]))
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# keypunch_emulator.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Virtual Arduino + IBM 029 served on a pseudo-terminal (Linux/macOS only).
+
+import os
+import sys
+import tty
+import time
+import random
+import select
+import argparse
+import threading
+from collections import deque
+from card_protocol import FrameDecoder, encode_frame, kStartBaudRate, kBaudRates, kBaudRevertTime
+from card_protocol import kFrameCard, kFrameEoj, kFrameQuery, kFrameAck, kFrameError, kFrameNak
+
+# Timing model of the 029 driven by the relay board (seconds, at speed 1)
+kColumnTime = 0.05      # Key a column
+kCardTime = 0.6         # Feed, register and eject a card
+kCardBuffer = 8         # Cards the firmware can keep queued
+kMaxColumns = 80
+
+kStartReply = "029 Puncher emulator started"
+kCardReply = "OK"
+kEojReply = "EOJ OK"
+
+# Emulates the Arduino firmware protocol on a pty.
+# The host sends "start", then one "data<card>" line per card and finally "eoj".
+# Every card is acknowledged with a line once punched, or with an "ERROR ..."
+# line when punching it fails. After "proto bin" the same exchange uses the
+# framed protocol of card_protocol.py, "baud <rate>" and "ping" negotiate the
+# link speed. A "start" line always finds the board freshly reset, as when the
+# real Mega 2560 is reset by the opening of the port.
+class KeypunchEmulator:
+    def __init__(self, speed = 1.0, column_time = kColumnTime, card_time = kCardTime,
+                 buffer_cards = kCardBuffer, error_cards = (), error_rate = 0.0,
+                 drop_cards = (), drop_rate = 0.0, garble_rate = 0.0, corrupt_rate = 0.0,
+                 binary = True, baud = True, max_baud = kBaudRates[0], seed = None, verbose = False):
+        self.speed = float(speed)
+        self.column_time = column_time
+        self.card_time = card_time
+        self.buffer_cards = buffer_cards
+        self.error_cards = set(error_cards)   # Card numbers answered with ERROR
+        self.error_rate = error_rate          # Probability of a random ERROR
+        self.drop_cards = set(drop_cards)     # Card numbers never acknowledged
+        self.drop_rate = drop_rate            # Probability of a lost ack
+        self.garble_rate = garble_rate        # Probability of an undecodable ack
+        self.corrupt_rate = corrupt_rate      # Probability of a card frame received corrupted
+        self.binary = binary                  # Offer the binary protocol
+        self.offer_baud = baud                # Offer the baud rate negotiation
+        self.max_baud = max_baud              # Faster rates fail the ping probe
+        self.verbose = verbose
+        self.random = random.Random(seed)
+
+        self.port = None
+        self.started = False
+        self.binary_mode = False
+        self.baud = kStartBaudRate
+        self.cards_received = 0
+        self.cards_punched = 0
+        self.jobs = 0
+
+        self._master = None
+        self._slave = None
+        self._cards = deque()
+        self._decoder = FrameDecoder()
+        self._expected_seq = 0
+        self._last_seq = None
+        self._probe_deadline = None
+        self._cards_ready = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target = self._read_loop, name = "emulator-reader", daemon = True),
+            threading.Thread(target = self._punch_loop, name = "emulator-punch", daemon = True),
+        ]
+        for t in self._threads:
+            t.start()
+        return self.port
+
+    def close(self):
+        self._stopped.set()
+        with self._cards_ready:
+            self._cards_ready.notify_all()
+        for t in self._threads:
+            t.join(1.0)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def _log(self, msg):
+        if self.verbose:
+            print(f"[emulator] {msg}")
+
+    def _sleep(self, seconds):
+        if self.speed > 0:
+            self._stopped.wait(seconds / self.speed)
+
+    def _write(self, data):
+        with self._write_lock:
+            try:
+                os.write(self._master, data)
+            except OSError:
+                pass
+
+    def _reply(self, text):
+        self._log(f"Reply: {text}")
+        self._write((text + "\r\n").encode("utf-8"))
+
+    def _reply_frame(self, frame_type, seq, text = ""):
+        self._log(f"Reply frame: {chr(frame_type)} {seq} {text}")
+        self._write(encode_frame(frame_type, seq, text.encode("utf-8")))
+
+    def _caps(self):
+        caps = (["BIN"] if self.binary else []) + (["BAUD"] if self.offer_baud else [])
+        return f"CAPS={','.join(caps)}" if caps else ""
+
+    def _reset(self):
+        self.binary_mode = False
+        self.baud = kStartBaudRate
+        self._decoder = FrameDecoder()
+        self._expected_seq = 0
+        self._last_seq = None
+        self._probe_deadline = None
+
+    def _read_loop(self):
+        pending = b""
+        while not self._stopped.is_set():
+            try:
+                ready, _, _ = select.select([self._master], [], [], 0.1)
+                if not ready:
+                    self._check_probe()
+                    continue
+                data = os.read(self._master, 4096)
+            except OSError:
+                break
+            if not data:
+                continue
+            pending += data
+            while pending:
+                if self.binary_mode:
+                    if not self._decoder.buffer and pending.startswith(b"start") and b"\n" in pending:
+                        # The host reopened the port: the board resets
+                        self._reset()
+                        continue
+                    for frame in self._decoder.feed(pending):
+                        self._handle_frame(*frame)
+                    pending = b""
+                    break
+                if b"\n" not in pending:
+                    break
+                line, pending = pending.split(b"\n", 1)
+                self._handle_line(line.decode("utf-8", errors = "replace"))
+
+    # Without a ping after a baud change the firmware goes back to the start rate
+    def _check_probe(self):
+        if self._probe_deadline is not None and time.monotonic() > self._probe_deadline:
+            self._log(f"No ping at {self.baud} baud, back to {kStartBaudRate}")
+            self.baud = kStartBaudRate
+            self._probe_deadline = None
+
+    def _handle_line(self, line):
+        line = line.rstrip("\r")
+        self._log(f"Received: {line}")
+
+        if line.startswith("start"):
+            self._reset()
+            self.started = True
+            self._reply(f"{kStartReply} {self._caps()}".strip())
+
+        elif line.startswith("baud"):
+            parts = line.split()
+            rate = int(parts[1]) if len(parts) == 2 and parts[1].isdigit() else 0
+            if self.offer_baud and rate in kBaudRates + (kStartBaudRate,):
+                self._reply(f"OK BAUD {rate}")
+                self.baud = rate
+                self._probe_deadline = time.monotonic() + kBaudRevertTime
+            else:
+                self._reply("ERROR Unsupported baud rate")
+
+        elif line.startswith("ping"):
+            if self.baud > self.max_baud:
+                # Unstable link: the reply arrives garbled
+                self._write(b"\xff\xfe\xfd\r\n")
+            else:
+                self._probe_deadline = None
+                self._reply("pong")
+
+        elif line.startswith("proto"):
+            if self.binary and line.split()[1:] == ["bin"]:
+                self._reply("OK BIN")
+                self.binary_mode = True
+            else:
+                self._reply("ERROR Unsupported protocol")
+
+        elif line.startswith("data"):
+            if not self.started:
+                self._reply("ERROR Not started")
+                return
+            self.cards_received += 1
+            with self._cards_ready:
+                if len(self._cards) >= self.buffer_cards:
+                    self._reply("ERROR Card buffer overflow")
+                    return
+                self._cards.append((self.cards_received, line[4:], None))
+                self._cards_ready.notify()
+
+        elif line.startswith("eoj"):
+            # EOJ is answered after the queued cards are punched
+            with self._cards_ready:
+                self._cards.append((None, None, None))
+                self._cards_ready.notify()
+
+        elif line:
+            self._reply(f"ERROR Unknown command: {line[:16]}")
+
+    def _handle_frame(self, frame_type, seq, payload):
+        if frame_type == kFrameCard and self.random.random() < self.corrupt_rate:
+            frame_type = None
+
+        if frame_type is None:
+            # Corrupted frame: ask for everything from the expected one
+            self._log("Received corrupted frame")
+            self._reply_frame(kFrameNak, self._expected_seq)
+            return
+
+        self._log(f"Received frame: {chr(frame_type)} {seq} {payload!r}")
+
+        if frame_type == kFrameCard:
+            # Go-back-N: cards after a corrupted one are dropped until resent,
+            # a card past a gap repeats the NAK in case the first one got lost
+            if seq != self._expected_seq:
+                if 0 < (seq - self._expected_seq) & 0xFFFF < 0x8000:
+                    self._reply_frame(kFrameNak, self._expected_seq)
+                return
+            self._expected_seq = (seq + 1) & 0xFFFF
+            self.cards_received += 1
+            with self._cards_ready:
+                if len(self._cards) >= self.buffer_cards:
+                    self._reply_frame(kFrameError, seq, "Card buffer overflow")
+                    return
+                self._cards.append((self.cards_received, payload.decode("utf-8", errors = "replace"), seq))
+                self._cards_ready.notify()
+
+        elif frame_type == kFrameEoj:
+            self._expected_seq = (seq + 1) & 0xFFFF
+            with self._cards_ready:
+                self._cards.append((None, None, seq))
+                self._cards_ready.notify()
+
+        elif frame_type == kFrameQuery:
+            if self._last_seq is not None:
+                self._reply_frame(kFrameAck, self._last_seq, kCardReply)
+
+        else:
+            self._reply_frame(kFrameError, seq, f"Unknown frame type {frame_type}")
+
+    def _punch_loop(self):
+        while not self._stopped.is_set():
+            with self._cards_ready:
+                while not self._cards and not self._stopped.is_set():
+                    self._cards_ready.wait()
+                if self._stopped.is_set():
+                    break
+                number, card, seq = self._cards[0]
+
+            if number is None:
+                self.jobs += 1
+                if seq is None:
+                    self._reply(kEojReply)
+                else:
+                    self._reply_frame(kFrameEoj, seq, kEojReply)
+            else:
+                self._punch_card(number, card, seq)
+
+            with self._cards_ready:
+                self._cards.popleft()
+
+    def _punch_card(self, number, card, seq):
+        card = card.rstrip("\r")
+
+        def error(text):
+            if seq is None:
+                self._reply(f"ERROR {text}")
+            else:
+                self._reply_frame(kFrameError, seq, text)
+
+        if len(card) > kMaxColumns:
+            error(f"Card {number} longer than {kMaxColumns} columns")
+            return
+
+        line_time = (len(card) + 6) * 10 / self.baud
+        self._sleep(line_time + self.card_time + len(card) * self.column_time)
+
+        if number in self.error_cards or self.random.random() < self.error_rate:
+            error(f"Punch not registered on card {number}")
+            return
+
+        self.cards_punched += 1
+        self._last_seq = seq
+
+        if number in self.drop_cards or self.random.random() < self.drop_rate:
+            self._log(f"Dropped ack of card {number}")
+            return
+
+        if self.random.random() < self.garble_rate:
+            if seq is None:
+                self._write(b"\xff\xfe" + kCardReply.encode("utf-8") + b"\r\n")
+            else:
+                frame = bytearray(encode_frame(kFrameAck, seq, kCardReply.encode("utf-8")))
+                frame[len(frame) // 2] ^= 0xFF
+                self._write(bytes(frame))
+            return
+
+        if seq is None:
+            self._reply(f"{kCardReply} {number}")
+        else:
+            self._reply_frame(kFrameAck, seq, f"{kCardReply} {number}")
+
+def _card_numbers(text):
+    return [int(n) for n in text.split(",") if n.strip()] if text else []
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Emulate the 029 Arduino keypunch on a pseudo-terminal.")
+    parser.add_argument("--speed", type = float, default = 1.0, help = "Speed factor (100 = 100x faster, 0 = no delay)")
+    parser.add_argument("--column-time", type = float, default = kColumnTime, help = "Seconds per column at speed 1")
+    parser.add_argument("--card-time", type = float, default = kCardTime, help = "Seconds per card at speed 1")
+    parser.add_argument("--buffer", type = int, default = kCardBuffer, help = "Cards the firmware can keep queued")
+    parser.add_argument("--error-cards", default = "", help = "Comma separated card numbers answered with ERROR")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "Probability of a random ERROR")
+    parser.add_argument("--drop-cards", default = "", help = "Comma separated card numbers never acknowledged")
+    parser.add_argument("--drop-rate", type = float, default = 0.0, help = "Probability of a lost acknowledgement")
+    parser.add_argument("--garble-rate", type = float, default = 0.0, help = "Probability of an undecodable acknowledgement")
+    parser.add_argument("--corrupt-rate", type = float, default = 0.0, help = "Probability of a card frame received corrupted")
+    parser.add_argument("--text-only", action = "store_true", help = "Do not offer the binary protocol")
+    parser.add_argument("--no-baud", action = "store_true", help = "Do not offer the baud rate negotiation")
+    parser.add_argument("--max-baud", type = int, default = kBaudRates[0], help = "Faster baud rates fail the probe")
+    parser.add_argument("--seed", type = int, default = None, help = "Random seed for the fault injection")
+    parser.add_argument("--verbose", action = "store_true", help = "Print the traffic")
+    args = parser.parse_args()
+
+    emulator = KeypunchEmulator(
+        speed = args.speed,
+        column_time = args.column_time,
+        card_time = args.card_time,
+        buffer_cards = args.buffer,
+        error_cards = _card_numbers(args.error_cards),
+        error_rate = args.error_rate,
+        drop_cards = _card_numbers(args.drop_cards),
+        drop_rate = args.drop_rate,
+        garble_rate = args.garble_rate,
+        corrupt_rate = args.corrupt_rate,
+        binary = not args.text_only,
+        baud = not args.no_baud,
+        max_baud = args.max_baud,
+        seed = args.seed,
+        verbose = args.verbose
+    )
+
+    try:
+        port = emulator.open()
+        print(f"Emulated 029 keypunch on {port}")
+        print(f"Run the puncher with: PUNCHER_PORT={port} python3 main.py")
+
+        while True:
+            time.sleep(1)
+
+    except KeyboardInterrupt:
+        print(f"\nCards punched: {emulator.cards_punched}, jobs: {emulator.jobs}")
+        emulator.close()
+        sys.exit(0)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# log_pipeline.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Log of the punching operations shown in the main view. Messages are posted
+# from any thread to a deque (append and popleft are atomic, no lock and no
+# signal per message) and a GUI timer moves them to the view in one append
+# per frame. The timer runs only while there are messages to show, an idle
+# program is not woken up. The view keeps only the last lines, the whole
+# history of the session is written to a log file.
+
+import os
+from collections import deque
+from datetime import datetime
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from settings import get_setting
+
+kLogFrameInterval = 50      # ms between two updates of the view
+kLogMaxLines = 5000         # lines kept in the view, setting "log_max_lines"
+kLogDir = "LOGS"
+
+class LogPipeline(QObject):
+    # Starts the timer on the GUI thread, emitted only when it is stopped
+    wake = pyqtSignal()
+
+    def __init__(self, view, max_lines = None, log_dir = kLogDir, parent = None):
+        super().__init__(parent)
+        self.view = view
+        self.max_lines = max_lines or get_setting("log_max_lines", kLogMaxLines)
+        self.view.setMaximumBlockCount(self.max_lines)
+        self.pending = deque()
+        self.log_dir = log_dir
+        self.history_file = None
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(kLogFrameInterval)
+        self.timer.timeout.connect(self.flush)
+        self.scheduled = False
+        self.wake.connect(self.timer.start)
+
+    # From any thread
+    def post(self, msg):
+        self.pending.append(str(msg))
+        if not self.scheduled:
+            self.scheduled = True
+            self.wake.emit()
+
+    # GUI thread: everything posted since the last frame
+    def flush(self):
+        if not self.pending:
+            self.timer.stop()
+            self.scheduled = False
+            # Posted after the check above, by a thread that saw scheduled
+            if self.pending:
+                self.scheduled = True
+                self.timer.start()
+            return
+        batch = []
+        try:
+            while True:
+                batch.append(self.pending.popleft())
+        except IndexError:
+            pass
+
+        self._write_history(batch)
+        # Messages that would scroll out of the view right away are not laid out
+        self.view.appendPlainText("\n".join(batch[-self.max_lines:]))
+
+    # Opened for every batch, so the file can be deleted while the program runs
+    def _write_history(self, batch):
+        try:
+            if self.history_file is None:
+                os.makedirs(self.log_dir, exist_ok = True)
+                timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+                self.history_file = os.path.join(self.log_dir, f"session_log_{timestamp}.log")
+            with open(self.history_file, "a", encoding = "utf-8") as f:
+                f.write("\n".join(batch) + "\n")
+        except OSError as e:
+            print(f"Could not write the session log: {e}")
+
+    def close(self):
+        self.timer.stop()
+        self.flush()
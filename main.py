@@ -7,17 +7,14 @@
 import os
 import sys
 import signal
+import socket
 import traceback
-import logging
-from pathlib import Path
-from PyQt5.QtWidgets import QApplication, QSplashScreen, QMessageBox, QDialog
+from PyQt5.QtWidgets import QApplication, QSplashScreen, QMessageBox
 from PyQt5.QtGui import QPixmap, QPainter
-from PyQt5.QtCore import Qt, QTimer
-from main_window import MainWindow
-from git import git_check_update
-from git_dialog import UpdateDialog
+from PyQt5.QtCore import Qt, QSocketNotifier
 
-kSplashTimeout = 2000 # millisecs
+# The main window (with the punch engine, numpy and asyncio) is imported once
+# the splash screen is up
 
 # PRINT_ATTRIBUTES
 RED = "\033[31m"
@@ -33,8 +30,27 @@ RESET = "\033[0m"
 # ------------------------------------------------------------------------------
 def handle_interrupt():
     print(f"{BOLD}\nProgram interrupted.{RESET}")
-    # QApplication.quit()
-    sys.exit(1)
+    QApplication.exit(1)
+
+# Ctrl-C: the signal wakes up the Qt event loop through a socket instead of a
+# timer polling for it, then the Python handler runs
+# ------------------------------------------------------------------------------
+def install_interrupt_handler(app):
+    app.signal_sockets = socket.socketpair()
+    for sock in app.signal_sockets:
+        sock.setblocking(False)
+    signal.set_wakeup_fd(app.signal_sockets[1].fileno())
+
+    def drain():
+        try:
+            while app.signal_sockets[0].recv(64):
+                pass
+        except OSError:
+            pass
+
+    app.signal_notifier = QSocketNotifier(app.signal_sockets[0].fileno(), QSocketNotifier.Read)
+    app.signal_notifier.activated.connect(drain)
+    signal.signal(signal.SIGINT, lambda sig, frame: handle_interrupt())
 
 # ------------------------------------------------------------------------------
 def show_splash_screen(app):
@@ -62,41 +78,28 @@ def show_splash_screen(app):
     splash.raise_()
     splash.activateWindow()
 
-    def show_main_window():
-        try:
-            # splash.finish(app.window)
-            app.window = MainWindow()
-            app.window.show()
-        except Exception as e:
-            print(f"{RED}Error showing main window: {e}{RESET}")
-            err = traceback.format_exc()
-            QMessageBox.critical(None, "Startup Error", err)
-            QApplication.quit()
-            
-    def check_updates():        
-        result = git_check_update(do_update = False)
-        commits = result["commits"]
-        splash.finish(app.window)
-        
-        if commits:
-            print(len(commits), "commit(s) behind")
-            dlg = UpdateDialog(f"Commits available: {len(commits)}", commits)
-            if dlg.exec_() == QDialog.Accepted:
-                print("Updating...")
-                result = git_check_update(do_update = True)
-                if result["updated"]:
-                    print("Program updated. Restarting...")
-                    os.execv(sys.executable, [sys.executable] + sys.argv)
-            else:
-                print("Update cancelled")
-        else:
-            print("No commits to apply")
-            
-        show_main_window()
-        
-    QTimer.singleShot(kSplashTimeout, check_updates)
-    
+    # Paint the splash before the main window is built
     app.processEvents()
+    return splash
+
+# The main window is built while the splash shows, the update check runs in
+# the background (see update_service.py)
+# ------------------------------------------------------------------------------
+def show_main_window(app, splash):
+    try:
+        from main_window import MainWindow
+        app.window = MainWindow()
+        app.window.show()
+        splash.finish(app.window)
+    except Exception as e:
+        print(f"{RED}Error showing main window: {e}{RESET}")
+        err = traceback.format_exc()
+        splash.close()
+        QMessageBox.critical(None, "Startup Error", err)
+        return False
+
+    app.window.start_update_check()
+    return True
     
 # ------------------------------------------------------------------------------
 def main():
@@ -104,16 +107,13 @@ def main():
     
     app = QApplication(sys.argv)
     app.setApplicationName("029 Puncher")
+    app.window = None
     
-    signal.signal(signal.SIGINT, lambda sig, frame: handle_interrupt())
+    install_interrupt_handler(app)
 
-    show_splash_screen(app)
-   
-    # Dummy timer to keep the Qt event loop alive and processing events
-    app.window = None
-    app.timer = QTimer()
-    app.timer.timeout.connect(lambda: None)
-    app.timer.start(100)
+    splash = show_splash_screen(app)
+    if not show_main_window(app, splash):
+        sys.exit(1)
 
     status = app.exec_()
     print(f"{BOLD}Program quit.{RESET}")
@@ -128,4 +128,3 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nProgram Interrupted.")
         sys.exit(1)
-            
\ No newline at end of file
@@ -6,16 +6,30 @@
 
 import os
 import time
+import asyncio
 from PyQt5.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal, pyqtSlot, QSize
 from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QFileDialog, QMenu, QAction
-from PyQt5.QtWidgets import QHBoxLayout, QMessageBox, QMainWindow, QTextEdit, QApplication, QSpinBox
-from CDto029b import punch_file, punch_file_test, punching_stopped
+from PyQt5.QtWidgets import QHBoxLayout, QMessageBox, QMainWindow, QPlainTextEdit, QApplication, QSpinBox
+from PyQt5.QtWidgets import QListWidget, QListWidgetItem, QComboBox, QInputDialog
+from CDto029b import punch_file_async, punch_file_test, punching_stopped
+from punch_session import PunchSession
 from worker import PunchWorker
+from punch_async import get_runner
+from spooler import Spooler, kPolicies, kDefaultPolicy
+from punch_journal import find_journal, pending_jobs, file_hash
+from card_index import count_rows
+from deck_validate import validate_deck
+from deck_preview import DeckPreview
+from log_pipeline import LogPipeline
+from punch_metrics import JobMetrics
+from metrics_panel import MetricsPanel
 
-kPunchMethod = punch_file # punch_file / punch_file_test 
+kPunchMethod = punch_file_async # punch_file_async / punch_file_test 
 
-class LogTextEdit(QTextEdit):
+# Lays out only the lines on screen, old lines are dropped past the maximum
+# block count
+class LogTextEdit(QPlainTextEdit):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -29,6 +43,10 @@ class LogTextEdit(QTextEdit):
         menu.addAction(clear_action)
         menu.exec_(self.mapToGlobal(pos))
         
+# Spooler notifications, emitted from the punch event loop thread
+class SpoolerSignals(QObject):
+    changed = pyqtSignal()
+
 class MainView(QWidget):
     def __init__(self):
         super().__init__()
@@ -47,6 +65,10 @@ class MainView(QWidget):
         self.punch_button.clicked.connect(self.punch_file)
         self.punch_button.setEnabled(False)
         
+        self.queue_button = QPushButton("Add Selected File to Punch Queue")
+        self.queue_button.clicked.connect(self.queue_file)
+        self.queue_button.setEnabled(False)
+
         self.stop_button = QPushButton("Stop Punching")
         self.stop_button.setEnabled(False)
         self.stop_button.clicked.connect(self.stop_punching_file) 
@@ -73,8 +95,47 @@ class MainView(QWidget):
         self.layout.addWidget(self.select_button)
         self.layout.addWidget(self.file_label)
         self.layout.addWidget(self.punch_button)
+        self.layout.addWidget(self.queue_button)
         self.layout.addWidget(self.stop_button)
 
+        # Punch queue
+        self.policy_combo = QComboBox()
+        self.policy_combo.addItems(kPolicies)
+        self.policy_combo.setCurrentText(kDefaultPolicy)
+        self.policy_combo.setToolTip("fifo: in order added, priority: highest first, sjf: shortest deck first")
+        self.policy_combo.currentTextChanged.connect(self.set_queue_policy)
+
+        self.resume_button = QPushButton("Resume Queue")
+        self.resume_button.clicked.connect(self.resume_queue)
+        self.resume_button.setEnabled(False)
+
+        queue_row = QHBoxLayout()
+        queue_row.addWidget(QLabel("Punch queue, order:"))
+        queue_row.addWidget(self.policy_combo)
+        queue_row.addStretch(1)
+        queue_row.addWidget(self.resume_button)
+
+        self.queue_list = QListWidget()
+        self.queue_list.setMaximumHeight(100)
+        self.queue_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.queue_list.customContextMenuRequested.connect(self._show_queue_menu)
+
+        self.layout.addLayout(queue_row)
+        self.layout.addWidget(self.queue_list)
+
+        # Cards of the selected deck, shown when a deck is selected
+        self.preview_label = QLabel("Cards (select rows to set the range):")
+        self.preview = DeckPreview()
+        self.preview.range_selected.connect(self._on_preview_range)
+        self.preview_label.setVisible(False)
+        self.preview.setVisible(False)
+        self.layout.addWidget(self.preview_label, 0)
+        self.layout.addWidget(self.preview, 1)
+
+        # Throughput and latency of the punch job
+        self.metrics_panel = MetricsPanel()
+        self.layout.addWidget(self.metrics_panel, 0)
+
         self.arduino_label = QLabel("Punching operations log:")
         self.arduino_messages = LogTextEdit()
         
@@ -83,11 +144,22 @@ class MainView(QWidget):
         
         self.arduino_messages.setFont(font)
         self.arduino_messages.setReadOnly(True)
+        self.log_pipeline = LogPipeline(self.arduino_messages, parent = self)
        
         self.layout.addWidget(self.arduino_label, 0)
         self.layout.addWidget(self.arduino_messages, 1)
                
         self.cd_file = None
+
+        # Connection to the punch kept open across the punch jobs
+        self.session = None
+
+        # Decks queued for punching, the dispatcher starts with the first deck
+        self._punching = False
+        self.spooler_signals = SpoolerSignals()
+        self.spooler_signals.changed.connect(self._refresh_queue)
+        self.spooler = Spooler(policy = kDefaultPolicy, log = self.log_pipeline.post, on_change = self.spooler_signals.changed.emit)
+        self._refresh_queue()
         
         self.resize(800, 600)
 
@@ -98,6 +170,7 @@ class MainView(QWidget):
             self.file_label.setText("No file selected")
             self.punch_button.setText("Punch Selected File")
             self.punch_button.setEnabled(False)
+            self.queue_button.setEnabled(False)
             
             self.layout.removeWidget(self.range_row_widget)
             self.range_row_widget.setParent(None)
@@ -106,6 +179,10 @@ class MainView(QWidget):
             self.rows_total_label.setParent(None)
 
             self._range_widgets_added = False
+
+            self.preview.close_deck()
+            self.preview_label.setVisible(False)
+            self.preview.setVisible(False)
  
             return
 
@@ -118,13 +195,23 @@ class MainView(QWidget):
             self.file_label.setText(f"Selected file: {filename}")
             self.punch_button.setText(f"Punch {filename}")
             self.punch_button.setEnabled(True)
+            self.queue_button.setEnabled(True)
 
             # Count rows (cards) in the selected file
             try:
-                self._rows_total = 0
-                with open(path, "rb") as f:
-                    for _ in f:  # splitlines-agnostic, works with CRLF or LF
-                        self._rows_total += 1
+                self._rows_total = count_rows(path)
+
+                # Show the cards that cannot be punched right away
+                deck = validate_deck(path)
+                self.log_pipeline.post(deck.format())
+
+                self.preview.open(path)
+                self.preview.set_error_rows(issue.row for issue in deck.issues if issue.is_error and issue.row)
+                self.preview_label.setVisible(True)
+                self.preview.setVisible(True)
+
+                if not deck.ok:
+                    QMessageBox.warning(self, "Deck Check", deck.format(limit = 10))
 
                 if not self._range_widgets_added:
                 
@@ -175,6 +262,10 @@ class MainView(QWidget):
                     self.range_start.valueChanged.connect(_sync_end_min)
                     self.range_end.valueChanged.connect(_sync_start_max)
 
+                    # Highlight the rows to punch in the preview
+                    self.range_start.valueChanged.connect(self._show_preview_range)
+                    self.range_end.valueChanged.connect(self._show_preview_range)
+
                     self._range_widgets_added = True
 
                 self.rows_total_label.setText(f"Total rows: {self._rows_total}")
@@ -184,50 +275,175 @@ class MainView(QWidget):
                 self.range_end.setMinimum(1)
                 self.range_end.setMaximum(self._rows_total)
                 self.range_end.setValue(self._rows_total)                
+                self._show_preview_range()
 
             except Exception as e:
                 QMessageBox.critical(self, "Error counting file rows:", str(e))
     
+    def _show_preview_range(self, _ = None):
+        self.preview.set_range(self.range_start.value(), self.range_end.value())
+
+    # Rows selected in the preview become the range to punch
+    def _on_preview_range(self, first, last):
+        if not self._range_widgets_added:
+            return
+        # Move the bound that keeps start <= end first
+        if first <= self.range_end.value():
+            self.range_start.setValue(first)
+            self.range_end.setValue(last)
+        else:
+            self.range_end.setValue(last)
+            self.range_start.setValue(first)
+
     def punch_file(self):
         if not self.cd_file:
             QMessageBox.warning(self, "No File", "Please select a .cd or .txt file to punch .")
             return
 
+        row_start = self.range_start.value()
+        row_end = self.range_end.value()
+        row_range = (row_start, row_end)
+        punch_all = (row_end - row_start + 1) == self._rows_total
+
+        # Offer to continue a previous run of the same job
+        resume = False
+        journal = find_journal(self.cd_file, row_range)
+        if journal is not None:
+            reply = QMessageBox.question(
+                self,
+                "Resume Punch",
+                f"A previous punch of these rows stopped after row {journal.last_card}.\nContinue from row {journal.last_card + 1} ?",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+                QMessageBox.Yes
+            )
+            if reply == QMessageBox.Cancel:
+                return
+            resume = reply == QMessageBox.Yes
+
+        self.start_punch(self.cd_file, row_range, punch_all, resume)
+
+    # Resume a job interrupted in a previous run of the program
+    def resume_job(self):
+        jobs = [job for job in pending_jobs() if os.path.exists(job["file"]) and file_hash(job["file"]) == job["hash"]]
+        if not jobs:
+            QMessageBox.information(self, "Resume Punch", "No interrupted punch job to resume.")
+            return
+
+        items = [f"{os.path.basename(job['file'])}: rows {job['range'][0]} to {job['range'][1]}, stopped after row {job['last_card']}" for job in jobs]
+        item, ok = QInputDialog.getItem(self, "Resume Punch", "Interrupted punch jobs:", items, 0, False)
+        if not ok:
+            return
+
+        job = jobs[items.index(item)]
+        start_row, end_row = job["range"]
+        self.start_punch(job["file"], job["range"], (end_row - start_row + 1) == count_rows(job["file"]), True)
+
+    def start_punch(self, file_path, row_range, punch_all, resume = False):
         self.stop_button.setEnabled(True)
-        file_name = os.path.basename(self.cd_file)
+        self._punching = True
+        file_name = os.path.basename(file_path)
         
         try:
-            # Create thread + worker
-            self.worker = PunchWorker(kPunchMethod, self.cd_file)
-            self.thread = QThread(self)
-            self.worker.moveToThread(self.thread)
-
-            # Start + cleanup
-            self.thread.started.connect(self.worker.run)
-            self.worker.finished.connect(self.thread.quit)
+            # The worker runs the job on the punch event loop
+            self.worker = PunchWorker(kPunchMethod, file_path)
             self.worker.finished.connect(self.worker.deleteLater)
-            self.thread.finished.connect(self.thread.deleteLater)
 
             # Show outcome and errors and disable Stop when done
             self.worker.result.connect(self._on_punch_result)
             self.worker.error.connect(self._on_punch_error)         
             self.worker.finished.connect(self._on_punch_finished)
-            self.worker.message.connect(self._on_punch_log)
+            self.worker.log_pipeline = self.log_pipeline
 
-            row_start = self.range_start.value()
-            row_end = self.range_end.value()
-            row_range = (row_start, row_end)
-            punch_all = (row_end - row_start + 1) == self._rows_total
-            self.worker.kwargs = { "log": self.worker.message.emit, "range": row_range, "punch_all": punch_all }
-            self.worker.args = (self.cd_file,)
+            self.worker.kwargs = { "log": self.worker.log, "range": row_range, "punch_all": punch_all, "session": self.get_session() }
+            # punch_file_test has no journal and no metrics
+            if kPunchMethod is punch_file_async:
+                if resume:
+                    self.worker.kwargs["resume"] = True
+                self.worker.kwargs["metrics"] = JobMetrics()
+                self.metrics_panel.set_metrics(self.worker.kwargs["metrics"])
+            self.worker.args = (file_path,)
 
-            self.thread.start()
+            self.worker.start()
 
         except Exception as e:
             QMessageBox.critical(self, f"Punch {file_name} failed. Error:", str(e))
 
+    def get_session(self):
+        if self.session is None:
+            self.session = PunchSession()
+        return self.session
+
+    def queue_file(self):
+        if not self.cd_file:
+            return
+
+        row_range = (self.range_start.value(), self.range_end.value())
+        try:
+            self.spooler.submit(self.cd_file, range = row_range)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Punch Queue", str(e))
+            return
+
+        self.start_queue()
+
+    # The dispatcher runs until the queue is empty or paused, it does not poll
+    # the spool file while the program is idle
+    def start_queue(self):
+        self.spooler.session = self.get_session()
+        self.spooler.start(until_empty = True)
+
+    def set_queue_policy(self, policy):
+        self.spooler.set_policy(policy)
+
+    def resume_queue(self):
+        self.spooler.resume()
+        self.start_queue()
+
+    def _show_queue_menu(self, pos):
+        item = self.queue_list.itemAt(pos)
+        if item is None or item.data(Qt.UserRole) is None:
+            return
+        menu = QMenu(self)
+        cancel_action = QAction("Remove from Queue", self)
+        cancel_action.triggered.connect(lambda: self.spooler.cancel(item.data(Qt.UserRole)))
+        menu.addAction(cancel_action)
+        menu.exec_(self.queue_list.mapToGlobal(pos))
+
+    @pyqtSlot()
+    def _refresh_queue(self):
+        self.queue_list.clear()
+        current = self.spooler.current
+        if current is not None:
+            item = QListWidgetItem(f"Punching: {os.path.basename(current.file_path)} rows {current.range[0]} to {current.range[1]}")
+            self.queue_list.addItem(item)
+        self.stop_button.setEnabled(current is not None or self._punching)
+        for job in self.spooler.queued():
+            item = QListWidgetItem(f"{os.path.basename(job.file_path)} rows {job.range[0]} to {job.range[1]} ({job.cards} cards)")
+            item.setData(Qt.UserRole, job.id)
+            self.queue_list.addItem(item)
+        self.resume_button.setEnabled(self.spooler.paused)
+
     def stop_punching_file(self):
         punching_stopped.set()
+
+    # Stops the running job, if any, and closes the connection on the punch
+    # event loop when the job is over: the GUI never waits for the session
+    def close_session(self):
+        self.spooler.stop()
+        self.log_pipeline.flush()
+        if self.session is None:
+            return
+        if self._punching or self.spooler.current is not None:
+            punching_stopped.set()
+        get_runner().submit(self._close_when_idle(self.session))
+
+    @staticmethod
+    async def _close_when_idle(session):
+        await asyncio.get_running_loop().run_in_executor(None, session.lock.acquire)
+        try:
+            session.close()
+        finally:
+            session.lock.release()
  
     @pyqtSlot(object, bool, tuple)
     def _on_punch_result(self, response, aborted, row_range):
@@ -246,11 +462,8 @@ class MainView(QWidget):
         print(f"Punching error: {msg}")
         QMessageBox.critical(self, "Punching Error", msg)
 
-    @pyqtSlot(object)
-    def _on_punch_log(self, log):
-        msg = str(log)
-        self.arduino_messages.append(msg)
-
     @pyqtSlot()
     def _on_punch_finished(self):        
-        self.stop_button.setEnabled(False)
+        self._punching = False
+        self.metrics_panel.stop()
+        self.stop_button.setEnabled(self.spooler.current is not None)
@@ -20,10 +20,21 @@ from PyQt5.QtGui import QPixmap
 from main_view import MainView
 from git import git_check_update
 from git_dialog import UpdateDialog
+from update_service import UpdateService
 from arduino import upload_to_arduino
+from punch_log import kLogFile
 
 kLogDir = "LOGS"
 
+# Text logs and the punch log, rotated ones too (punch_log.jsonl.1 ...), not
+# the metrics history that shares the folder (punch_metrics.jsonl)
+def is_log_file(name):
+    return name.endswith(".log") or name == kLogFile or name.startswith(kLogFile + ".")
+
+# Result of the update service, emitted from its thread
+class UpdateSignals(QObject):
+    checked = pyqtSignal(object, object)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -42,6 +53,9 @@ class MainWindow(QMainWindow):
         self.action_punch_cd_files = QAction("Punch File…", self)
         self.action_punch_cd_files.triggered.connect(self.select_punch_file)
         self.actions_menu.addAction(self.action_punch_cd_files)
+        self.action_resume = QAction("Resume Interrupted Punch…", self)
+        self.action_resume.triggered.connect(self.resume_punch)
+        self.actions_menu.addAction(self.action_resume)
 
         # Utility menu
         self.utils_menu = self.menu.addMenu("Utility")
@@ -55,6 +69,10 @@ class MainWindow(QMainWindow):
         self.action_delete_log.triggered.connect(self.delete_log)
         self.utils_menu.addAction(self.action_delete_log)
         self.utils_menu.addSeparator()
+        self.action_disconnect = QAction("Disconnect Punch", self)
+        self.action_disconnect.triggered.connect(self.disconnect_punch)
+        self.utils_menu.addAction(self.action_disconnect)
+        self.utils_menu.addSeparator()
         self.action_arduino_upload = QAction("Upload to Arduino…", self)
         self.action_arduino_upload.triggered.connect(upload_to_arduino)
         self.utils_menu.addAction(self.action_arduino_upload)
@@ -63,6 +81,12 @@ class MainWindow(QMainWindow):
         self.action_update_check.triggered.connect(self.update_check)
         self.utils_menu.addAction(self.action_update_check)
                  
+        # Update check in the background, reported in the status bar
+        self.update_signals = UpdateSignals()
+        self.update_signals.checked.connect(self._on_update_checked)
+        self.update_service = UpdateService(on_result = self.update_signals.checked.emit)
+        self.update_button = None
+
         self.show_punch_files()
         # self.show_about_dialog()
             
@@ -96,6 +120,10 @@ class MainWindow(QMainWindow):
         self.show_punch_files()
         self.main_view.select_file()
         
+    def resume_punch(self):
+        self.show_punch_files()
+        self.main_view.resume_job()
+        
     def show_about_dialog(self):
         version = get_git_version()        
    
@@ -130,28 +158,80 @@ class MainWindow(QMainWindow):
     def delete_log(self):
         self.main_view.arduino_messages.clear()
 
+    def disconnect_punch(self):
+        if hasattr(self, "main_view") and self.main_view is not None:
+            self.main_view.close_session()
+
+    def closeEvent(self, event):
+        self.disconnect_punch()
+        super().closeEvent(event)
+
+    # At startup: fetch only if the last fetch is old enough
+    def start_update_check(self):
+        self.update_service.check()
+
     def update_check(self):
-        result = git_check_update(do_update = False)
-        commits = result["commits"]
+        if self.update_service.check(force = True, context = "menu"):
+            self.statusBar().showMessage("Checking for updates…")
+
+    @pyqtSlot(object, object)
+    def _on_update_checked(self, result, context):
+        commits = result.get("commits") or []
+        self.statusBar().clearMessage()
         if commits:
             print(len(commits), "commit(s) behind")
-            dlg = UpdateDialog(f"Commits available: {len(commits)}", commits)
-            if dlg.exec_() == QDialog.Accepted:
-                print("Updating...")
-                result = git_check_update(do_update = True)
-                if result["updated"]:
-                    print("Program updated. Restarting...")
-                    os.execv(sys.executable, [sys.executable] + sys.argv)
-            else:
-                print("Update cancelled")
+            self._show_update_button(commits)
+            if context == "menu":
+                self.show_update_dialog(commits)
+            return
+
+        if result.get("offline"):
+            print("Update check: no network")
+        elif result.get("fetch_error"):
+            print(f"Update check failed: {result['fetch_error']}")
         else:
             print("No commits to apply")
-            QMessageBox.information(
-                self,
-                "Update Check",
-                "Program 029 Puncher is up to date.",
-                QMessageBox.Ok
-            )
+
+        if context == "menu":
+            if result.get("offline"):
+                QMessageBox.warning(self, "Update Check", "The update server cannot be reached: no network.", QMessageBox.Ok)
+            elif result.get("fetch_error"):
+                QMessageBox.warning(self, "Update Check", f"Update check failed:\n{result['fetch_error']}", QMessageBox.Ok)
+            else:
+                QMessageBox.information(
+                    self,
+                    "Update Check",
+                    "Program 029 Puncher is up to date.",
+                    QMessageBox.Ok
+                )
+
+    # Non-modal notice of the updates in the status bar
+    def _show_update_button(self, commits):
+        if self.update_button is None:
+            self.update_button = QPushButton()
+            self.update_button.setFlat(True)
+            self.statusBar().addPermanentWidget(self.update_button)
+        try:
+            self.update_button.clicked.disconnect()
+        except TypeError:
+            pass
+        self.update_button.clicked.connect(lambda: self.show_update_dialog(commits))
+        self.update_button.setText(f"Update available: {len(commits)} commit(s)…")
+        self.update_button.setVisible(True)
+
+    def show_update_dialog(self, commits):
+        dlg = UpdateDialog(f"Commits available: {len(commits)}", commits)
+        if dlg.exec_() == QDialog.Accepted:
+            print("Updating...")
+            # Just fetched by the check
+            result = git_check_update(do_update = True, fetch = False)
+            if result["updated"]:
+                print("Program updated. Restarting...")
+                os.execv(sys.executable, [sys.executable] + sys.argv)
+            else:
+                QMessageBox.warning(self, "Update", f"Update failed: {result.get('msg')}")
+        else:
+            print("Update cancelled")
             
     def open_log_folder(self):
         log_dir = os.path.abspath(kLogDir)
@@ -170,7 +250,7 @@ class MainWindow(QMainWindow):
         log_files = []
         log_dir = os.path.abspath(kLogDir)
         if os.path.isdir(log_dir):
-            log_files = [f for f in os.listdir(log_dir) if f.endswith(".log")]
+            log_files = [f for f in os.listdir(log_dir) if is_log_file(f)]
         if len(log_files) == 0:
             QMessageBox.information(self, "Information", "No log file to delete.")
             return
@@ -188,7 +268,7 @@ class MainWindow(QMainWindow):
 
         count = 0
         for name in os.listdir(log_dir):
-            if name.endswith(".log"):
+            if is_log_file(name):
                 try:
                     os.remove(os.path.join(log_dir, name))
                     count += 1
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# metrics_panel.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Stats panel of the main view: throughput and latency of the running (or
+# last) punch job, read from its JobMetrics a few times a second.
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QGroupBox, QGridLayout, QLabel
+
+kMetricsRefreshInterval = 500   # ms
+
+def _ms(seconds):
+    return f"{seconds * 1000:.0f} ms" if seconds >= 0.01 else f"{seconds * 1000:.1f} ms"
+
+class MetricsPanel(QGroupBox):
+    kFields = ("Cards", "Cards/min", "Ack latency p50", "Ack latency p99", "Ack latency max",
+               "Punch time p50", "Write time p99", "Resends / timeouts")
+
+    def __init__(self, parent = None):
+        super().__init__("Punch stats", parent)
+        self.metrics = None
+        self.values = {}
+
+        layout = QGridLayout()
+        layout.setContentsMargins(6, 4, 6, 4)
+        layout.setVerticalSpacing(2)
+        columns = 4
+        for index, field in enumerate(self.kFields):
+            row, column = divmod(index, columns)
+            value = QLabel("-")
+            layout.addWidget(QLabel(f"{field}:"), row, column * 2)
+            layout.addWidget(value, row, column * 2 + 1)
+            self.values[field] = value
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(kMetricsRefreshInterval)
+        self.timer.timeout.connect(self.refresh)
+
+    # Show the metrics of a job, updated until stop() is called
+    def set_metrics(self, metrics):
+        self.metrics = metrics
+        self.refresh()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.refresh()
+
+    def refresh(self):
+        metrics = self.metrics
+        if metrics is None:
+            return
+        latency = metrics.ack_latency
+        shown = {
+            "Cards": str(metrics.cards),
+            "Cards/min": f"{metrics.cards_per_minute:.1f}",
+            "Ack latency p50": _ms(latency.quantile(0.5)),
+            "Ack latency p99": _ms(latency.quantile(0.99)),
+            "Ack latency max": _ms(latency.max or 0.0),
+            "Punch time p50": _ms(metrics.mechanical_time.quantile(0.5)),
+            "Write time p99": _ms(metrics.write_time.quantile(0.99)),
+            "Resends / timeouts": f"{metrics.resends} / {metrics.timeouts}",
+        }
+        for field, text in shown.items():
+            self.values[field].setText(text)
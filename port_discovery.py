@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# port_discovery.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Finds the serial port of the punch: the USB serial ports are filtered by
+# VID/PID, probed in parallel with the firmware start handshake and the winner
+# is cached with its identity, so later launches connect immediately.
+# The Arduino boards are probed first, the generic USB serial adapters (used
+# by the Mega clones, but by many other devices too) only if no board answers.
+
+import re
+import sys
+import time
+import serial
+import serial.tools.list_ports
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from settings import get_setting, set_setting
+
+# USB serial adapters used by the Arduino boards (VID, PID)
+kKnownDevices = {
+    (0x2341, 0x0010): "Arduino Mega 2560",
+    (0x2341, 0x0042): "Arduino Mega 2560 R3",
+    (0x2A03, 0x0010): "Arduino Mega 2560 (.org)",
+    (0x2A03, 0x0042): "Arduino Mega 2560 R3 (.org)",
+    (0x1A86, 0x7523): "CH340 USB serial",
+    (0x10C4, 0xEA60): "CP210x USB serial",
+    (0x0403, 0x6001): "FTDI USB serial",
+}
+
+# Vendors of the Arduino boards, the other known devices are generic adapters
+kArduinoVendors = {0x2341, 0x2A03}
+
+kProbeTimeout = 3.0 # seconds, the Mega 2560 resets when the port is opened
+kProbeBaudRate = 9600
+
+# Reply of the firmware to the start command: its name and version, or the
+# capabilities it advertises (i.e. "029 Puncher emulator started CAPS=BIN")
+kStartReplyPattern = re.compile(r"\b029\b|\bCAPS=|\bversion\b", re.IGNORECASE)
+
+def is_start_reply(line):
+    return kStartReplyPattern.search(line) is not None
+
+# Serial ports with a known USB VID/PID (all the ports if all_ports is set)
+def list_candidates(all_ports = False):
+    ports = []
+    for info in serial.tools.list_ports.comports():
+        if all_ports or (info.vid, info.pid) in kKnownDevices:
+            ports.append(info)
+    return ports
+
+def _identity(info):
+    return {
+        "device": info.device,
+        "vid": info.vid,
+        "pid": info.pid,
+        "serial_number": info.serial_number,
+        "description": info.description
+    }
+
+# The cached port if its device is still connected. A device identified by
+# serial number is found again even if it got a different port name.
+def cached_port():
+    cached = get_setting("punch_port")
+    if not cached:
+        return None
+
+    for info in serial.tools.list_ports.comports():
+        if (info.vid, info.pid) != (cached.get("vid"), cached.get("pid")):
+            continue
+        if cached.get("serial_number"):
+            if info.serial_number == cached["serial_number"]:
+                return info.device
+        elif info.device == cached.get("device"):
+            return info.device
+    return None
+
+def remember_port(port):
+    for info in serial.tools.list_ports.comports():
+        if info.device == port:
+            if get_setting("punch_port") != _identity(info):
+                set_setting("punch_port", _identity(info))
+            return
+    # Not a USB port (i.e. the emulator): nothing to identify it by
+
+def forget_port():
+    set_setting("punch_port", None)
+
+# Open port and send the start command. Returns the open serial port and the
+# start reply, or (None, None) if the firmware does not answer. The other lines
+# (a device that is not the punch, the boot noise of the board) are skipped.
+def probe_port(port, timeout = kProbeTimeout):
+    try:
+        ser = serial.Serial(port, kProbeBaudRate, timeout = timeout)
+    except (serial.SerialException, OSError):
+        return None, None
+
+    try:
+        ser.write("start   \n".encode('utf-8'))
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            ser.timeout = max(deadline - time.monotonic(), 0.01)
+            msg = ser.readline()
+            if msg:
+                try:
+                    reply = msg.decode('utf-8')
+                except UnicodeDecodeError:
+                    continue
+                if is_start_reply(reply):
+                    ser.timeout = timeout
+                    return ser, reply
+    except (serial.SerialException, OSError):
+        pass
+
+    ser.close()
+    return None, None
+
+def _close_probe(future):
+    ser, _ = future.result()
+    if ser is not None:
+        ser.close()
+
+# Probe ports in parallel, the first one to answer wins
+def _probe_ports(candidates, timeout):
+    winner = (None, None, None)
+    pool = ThreadPoolExecutor(max_workers = len(candidates))
+    futures = {pool.submit(probe_port, port, timeout): port for port in candidates}
+    try:
+        for future in as_completed(futures):
+            ser, reply = future.result()
+            if ser is not None:
+                winner = (futures[future], ser, reply)
+                break
+    finally:
+        # Do not wait for the other probes, close their ports when done
+        for future in futures:
+            if winner[0] is None or futures[future] != winner[0]:
+                future.add_done_callback(_close_probe)
+        pool.shutdown(wait = False)
+    return winner
+
+# Find the punch: the Arduino boards first, then the other candidate ports
+# if none of them is the punch.
+# Returns (port, open serial port, start reply), or (None, None, None).
+def discover_port(all_ports = False, timeout = kProbeTimeout, log = None):
+    ports = list_candidates(all_ports)
+    boards = [info.device for info in ports if info.vid in kArduinoVendors]
+    others = [info.device for info in ports if info.vid not in kArduinoVendors]
+
+    for candidates in (boards, others):
+        if not candidates:
+            continue
+        if log:
+            log(f"Probing serial ports: {', '.join(candidates)}")
+        winner = _probe_ports(candidates, timeout)
+        if winner[0]:
+            remember_port(winner[0])
+            if log:
+                log(f"Punch found on {winner[0]}")
+            return winner
+
+    if log and not ports:
+        log("Probing serial ports: none found")
+    return None, None, None
+
+if __name__ == "__main__":
+    all_ports = "--all" in sys.argv[1:]
+
+    for info in list_candidates(all_ports = True):
+        known = kKnownDevices.get((info.vid, info.pid), "")
+        print(f"{info.device}: {info.description} {known}")
+
+    print(f"Cached port: {cached_port()}")
+
+    port, ser, reply = discover_port(all_ports = all_ports, log = print)
+    if ser:
+        print(f"Start reply: {reply.strip()}")
+        ser.close()
+    else:
+        print("No punch found.")
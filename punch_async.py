@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# punch_async.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# asyncio plumbing of the punch engine: a non-blocking stream over the serial
+# port and one event loop thread shared by all the punch jobs.
+
+import sys
+import asyncio
+import threading
+import serial
+
+kPollInterval = 0.1 # seconds, reader thread wake-up where there is no fd
+
+# Non-blocking reads and writes on an open pyserial port.
+# On POSIX the port fd is watched by the event loop; where there is no fd
+# (Windows) a reader thread feeds the loop.
+class SerialStream:
+    def __init__(self, ser):
+        self.ser = ser
+        self.loop = None
+        self.queue = None
+        self.fd = None
+        self.thread = None
+        self.closing = False
+        self.saved_timeout = None
+
+    def open(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.closing = False
+
+        fileno = getattr(self.ser, "fileno", None)
+        if fileno is not None and sys.platform != "win32":
+            self.fd = fileno()
+            self.loop.add_reader(self.fd, self._on_readable)
+        else:
+            self.saved_timeout = self.ser.timeout
+            self.ser.timeout = kPollInterval
+            self.thread = threading.Thread(target = self._read_thread, name = "serial-reader", daemon = True)
+            self.thread.start()
+        return self
+
+    def close(self):
+        self.closing = True
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.ser.timeout = self.saved_timeout
+
+    def _on_readable(self):
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+            self.queue.put_nowait(e)
+            return
+        if data:
+            self.queue.put_nowait(data)
+
+    def _read_thread(self):
+        while not self.closing:
+            try:
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                self.loop.call_soon_threadsafe(self.queue.put_nowait, e)
+                break
+            if data:
+                self.loop.call_soon_threadsafe(self.queue.put_nowait, data)
+
+    # Next chunk of received bytes, raises if the link dropped
+    async def read(self):
+        data = await self.queue.get()
+        if isinstance(data, Exception):
+            raise data
+        return data
+
+    async def write(self, data):
+        if data:
+            await self.loop.run_in_executor(None, self.ser.write, data)
+
+# One event loop in a background thread for all the punch jobs
+class AsyncRunner:
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self.started = threading.Event()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target = self._run, name = "punch-loop", daemon = True)
+            self.thread.start()
+            self.started.wait()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.started.set()
+        self.loop.run_forever()
+
+    # Schedule a coroutine, returns a concurrent.futures.Future
+    def submit(self, coro):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = AsyncRunner().start()
+        return _runner
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# punch_farm.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Punch farm: one deck split in contiguous shards punched at the same time by
+# several 029s, one per serial port. Every punch has its own session and stop
+# event; the log tells which punch produced which range of cards so the
+# stacks can be collated in order.
+
+import os
+import sys
+import signal
+import asyncio
+import argparse
+import threading
+from settings import get_setting
+from punch_session import PunchSession, kBinaryProtocol, kMaxBaudRate
+from port_discovery import list_candidates
+from card_index import count_rows
+from punch_metrics import JobMetrics, export_metrics
+
+# Split the rows start_row..end_row in count contiguous shards of almost the
+# same size. Returns a list of (first row, last row).
+def shard_range(start_row, end_row, count):
+    cards = end_row - start_row + 1
+    count = max(1, min(count, cards))
+    size, extra = divmod(cards, count)
+    shards = []
+    first = start_row
+    for index in range(count):
+        last = first + size - 1 + (1 if index < extra else 0)
+        shards.append((first, last))
+        first = last + 1
+    return shards
+
+# Ports of the farm: the farm_ports setting, otherwise every USB serial port
+# of a known Arduino board
+def farm_ports():
+    ports = get_setting("farm_ports")
+    if ports:
+        return list(ports)
+    return [info.device for info in list_candidates()]
+
+class FarmShard:
+    def __init__(self, port, range):
+        self.port = port
+        self.range = range
+        self.stop_event = threading.Event()
+        self.cards = range[1] - range[0] + 1
+        self.punched = 0
+        self.report = ""
+        self.aborted = False
+        self.metrics = JobMetrics(port = port)
+
+    # Rows actually punched, None if no card was punched
+    @property
+    def punched_range(self):
+        if self.punched == 0:
+            return None
+        return (self.range[0], self.range[0] + self.punched - 1)
+
+    @property
+    def complete(self):
+        return self.punched == self.cards and not self.aborted
+
+class PunchFarm:
+    def __init__(self, ports, binary = kBinaryProtocol, max_baud = kMaxBaudRate, log = None, progress = None):
+        if not ports:
+            raise ValueError("No ports for the punch farm")
+        self.ports = list(ports)
+        self.binary = binary
+        self.max_baud = max_baud
+        self.log = log
+        self.progress = progress
+        self.shards = []
+
+    def send_log(self, msg):
+        print(msg)
+        if self.log:
+            self.log(msg)
+
+    # Stop every punch of the farm, from any thread
+    def stop(self):
+        for shard in self.shards:
+            shard.stop_event.set()
+
+    async def _run_shard(self, file_path, shard):
+        from CDto029b import punch_file_async
+
+        def shard_log(msg):
+            if self.log:
+                self.log(f"[{shard.port}] {msg}")
+
+        def shard_progress(punched, total):
+            shard.punched = punched
+            if self.progress:
+                self.progress(shard.port, punched, total)
+
+        session = PunchSession(shard.port, binary = self.binary, max_baud = self.max_baud)
+        try:
+            shard.report, shard.aborted, _ = await punch_file_async(file_path, range = shard.range, punch_all = False, log = shard_log,
+                                                                    session = session, stop_event = shard.stop_event, progress = shard_progress,
+                                                                    metrics = shard.metrics, export = False)
+        except Exception as e:
+            shard.report, shard.aborted = f"Punch error: {e}", True
+        finally:
+            await asyncio.get_running_loop().run_in_executor(None, session.close)
+
+        # An error ends a job without setting aborted, a short count tells
+        if shard.punched < shard.cards:
+            shard.aborted = True
+
+    # Punch the rows in range of the file (all the file if None) across the
+    # punches. Returns the shards with what each punch did.
+    async def run(self, file_path, range = None):
+        if range is None:
+            range = (1, count_rows(file_path))
+        self.shards = [FarmShard(port, shard) for port, shard in zip(self.ports, shard_range(range[0], range[1], len(self.ports)))]
+
+        name = os.path.basename(file_path)
+        self.send_log(f"Punch farm: {name} rows {range[0]} to {range[1]} on {len(self.shards)} punches")
+        for index, shard in enumerate(self.shards, 1):
+            self.send_log(f"Stack {index}: rows {shard.range[0]} to {shard.range[1]} ({shard.cards} cards) on {shard.port}")
+
+        await asyncio.gather(*(self._run_shard(file_path, shard) for shard in self.shards))
+
+        # One textfile with the series of every punch, written once: a file
+        # per shard would replace the others
+        metrics = [shard.metrics for shard in self.shards if shard.metrics.job is not None]
+        if metrics:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, export_metrics, metrics)
+            except OSError as e:
+                self.send_log(f"Metrics not exported: {e}")
+
+        # Collation list: the stacks in deck order
+        self.send_log(f"Punch farm {'completed' if all(shard.complete for shard in self.shards) else 'interrupted'}: {name}")
+        for index, shard in enumerate(self.shards, 1):
+            punched = shard.punched_range
+            punched_str = f"rows {punched[0]} to {punched[1]}" if punched else "no rows"
+            self.send_log(f"Stack {index} from {shard.port}: {punched_str} punched")
+            if not shard.complete:
+                first_left = punched[1] + 1 if punched else shard.range[0]
+                self.send_log(f"Stack {index} from {shard.port}: rows {first_left} to {shard.range[1]} NOT punched")
+
+        return self.shards
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Punch a deck on several 029 punches at the same time")
+    parser.add_argument("file", help = "deck to punch")
+    parser.add_argument("--ports", help = "comma separated serial ports (default: farm_ports setting or all the Arduino ports)")
+    parser.add_argument("--range", help = "rows to punch, i.e. 10-20")
+    args = parser.parse_args()
+
+    ports = args.ports.split(",") if args.ports else farm_ports()
+    row_range = tuple(int(n) for n in args.range.split("-")) if args.range else None
+
+    def show_progress(port, punched, total):
+        print(f"[{port}] {punched}/{total} cards")
+
+    async def main():
+        farm = PunchFarm(ports, progress = show_progress)
+        if sys.platform != "win32":
+            asyncio.get_running_loop().add_signal_handler(signal.SIGINT, farm.stop)
+        shards = await farm.run(args.file, range = row_range)
+        return all(shard.complete for shard in shards)
+
+    try:
+        sys.exit(0 if asyncio.run(main()) else 1)
+
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    except KeyboardInterrupt:
+        print("\nProgram Interrupted.")
+        sys.exit(1)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# punch_journal.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Resume journal of the punch jobs: an append-only file per job, keyed by the
+# hash of the deck and the range of rows, with one fsync'd record for every
+# card acknowledged by the punch. After a jam, a stop or a crash the job can
+# restart right after the last card confirmed. The journal is deleted when
+# the job completes.
+
+import os
+import sys
+import json
+import time
+import hashlib
+from settings import kSettingsDir
+
+kJournalDir = os.path.join(kSettingsDir, "journal")
+kJournalExt = ".jnl"
+
+def file_hash(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _fsync_dir(path):
+    if sys.platform == "win32":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# Records of a journal file, a record torn by a crash is ignored
+def read_records(path):
+    records = []
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+    except OSError:
+        pass
+    return records
+
+class PunchJournal:
+    def __init__(self, file_path, range, hash = None):
+        self.file_path = os.path.abspath(file_path)
+        self.range = tuple(range)
+        self.hash = hash or file_hash(file_path)
+        self.path = os.path.join(kJournalDir, f"{self.hash[:16]}_{self.range[0]}-{self.range[1]}{kJournalExt}")
+        self.fd = None
+        self.last_card = None
+
+    # Last card confirmed by a previous run of the job, None if there is none
+    def load(self):
+        self.last_card = None
+        for record in read_records(self.path):
+            if "card" in record:
+                self.last_card = record["card"]
+        return self.last_card
+
+    # Start the journal, or continue the previous one if resuming
+    def open(self, resume = False):
+        os.makedirs(kJournalDir, exist_ok = True)
+        if resume and self.load() is not None:
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            return self
+
+        self.last_card = None
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._append({"file": self.file_path, "hash": self.hash, "range": list(self.range), "started": time.time()})
+        _fsync_dir(kJournalDir)
+        return self
+
+    def _append(self, record):
+        os.write(self.fd, (json.dumps(record) + "\n").encode('utf-8'))
+        os.fsync(self.fd)
+
+    # The punch confirmed every card up to card (cumulative)
+    def record(self, card):
+        self._append({"card": card, "time": time.time()})
+        self.last_card = card
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    # The job completed, nothing to resume
+    def finish(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+# Journal of the job if it can be resumed, None otherwise
+def find_journal(file_path, range):
+    try:
+        journal = PunchJournal(file_path, range)
+    except OSError:
+        return None
+    return journal if journal.load() is not None else None
+
+# The jobs that can be resumed, as dicts with file, range, last_card and path
+def pending_jobs():
+    jobs = []
+    try:
+        names = sorted(os.listdir(kJournalDir))
+    except OSError:
+        return jobs
+
+    for name in names:
+        if not name.endswith(kJournalExt):
+            continue
+        path = os.path.join(kJournalDir, name)
+        records = read_records(path)
+        if not records or "file" not in records[0]:
+            continue
+        cards = [record["card"] for record in records if "card" in record]
+        if not cards:
+            continue
+        header = records[0]
+        jobs.append({"file": header["file"], "hash": header["hash"], "range": tuple(header["range"]),
+                     "last_card": cards[-1], "started": header.get("started"), "path": path})
+    return jobs
+
+def forget_job(job):
+    try:
+        os.remove(job["path"])
+    except OSError:
+        pass
+
+if __name__ == "__main__":
+    jobs = pending_jobs()
+    if not jobs:
+        print("No interrupted punch jobs.")
+
+    for job in jobs:
+        changed = not os.path.exists(job["file"]) or file_hash(job["file"]) != job["hash"]
+        start_row, end_row = job["range"]
+        print(f"{job['file']}: rows {start_row} to {end_row}, punched up to row {job['last_card']}{' (file changed)' if changed else ''}")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# punch_log.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Logging of the punch jobs. Logging a message only puts the record in a
+# queue; a background listener thread formats it and writes it to the sinks:
+# the console, the GUI (the log callback of the job) and a JSON-lines file in
+# LOGS rotated by size. Every sink has its own level, from the log_levels
+# setting, i.e. {"console": "WARNING", "gui": "DEBUG", "file": "DEBUG"}.
+# The messages of every card are DEBUG.
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import logging.handlers
+from settings import get_setting
+
+kLogDir = "LOGS"
+kLogFile = "punch_log.jsonl"
+kLogMaxBytes = 10 * 1024 * 1024     # size of the log file before rotating it
+kLogBackups = 5                     # rotated log files kept
+kLogDirMaxBytes = 100 * 1024 * 1024 # older .log files in LOGS are deleted past this
+
+kDefaultLevels = {"console": "INFO", "gui": "DEBUG", "file": "DEBUG"}
+
+_listener = None
+_lock = threading.Lock()
+_console_stream = None
+_console_level = None
+_job_ids = itertools.count(1)
+
+# Log record as one JSON line, with the wall clock and the monotonic time
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 6),
+            "mono": round(getattr(record, "mono", 0.0), 6),
+            "level": record.levelname,
+            "job": getattr(record, "job", None),
+            "card": getattr(record, "card", None),
+            "msg": record.getMessage(),
+        }
+        return json.dumps(entry, ensure_ascii = False)
+
+# Sends the records to the log callback of their job
+class GuiHandler(logging.Handler):
+    def emit(self, record):
+        gui = getattr(record, "gui", None)
+        if gui is None:
+            return
+        try:
+            gui(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+def _level(sink):
+    levels = get_setting("log_levels") or {}
+    level = logging.getLevelName(str(levels.get(sink, kDefaultLevels[sink])).upper())
+    return level if isinstance(level, int) else logging.INFO
+
+# Delete the oldest log files while the folder is larger than max_bytes
+def prune_logs(log_dir = kLogDir, max_bytes = kLogDirMaxBytes):
+    try:
+        files = [os.path.join(log_dir, name) for name in os.listdir(log_dir) if name.endswith(".log")]
+        files = sorted((os.stat(path).st_mtime, os.stat(path).st_size, path) for path in files)
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def _start():
+    global _listener
+    os.makedirs(kLogDir, exist_ok = True)
+    prune_logs()
+
+    file_handler = logging.handlers.RotatingFileHandler(os.path.join(kLogDir, kLogFile), maxBytes = kLogMaxBytes,
+                                                        backupCount = kLogBackups, encoding = "utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    file_handler.setLevel(_level("file"))
+
+    console_handler = logging.StreamHandler(_console_stream or sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    console_handler.setLevel(_console_level or _level("console"))
+
+    gui_handler = GuiHandler()
+    gui_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", datefmt = "%H:%M:%S"))
+    gui_handler.setLevel(_level("gui"))
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("punch")
+    logger.setLevel(min(handler.level for handler in (file_handler, console_handler, gui_handler)))
+    logger.propagate = False
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, gui_handler, respect_handler_level = True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+# Write the records still queued and stop the listener
+def stop_logging():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            logging.getLogger("punch").handlers.clear()
+            _listener = None
+
+# Console sink on stream (stdout if None) at level (the log_levels setting if
+# None), i.e. stderr for the scripts that write their own output on stdout
+def set_console(stream = None, level = None):
+    global _console_stream, _console_level
+    _console_stream = stream
+    _console_level = level
+    # Started again with the new console at the next record
+    stop_logging()
+
+def punch_logger():
+    with _lock:
+        if _listener is None:
+            _start()
+    return logging.getLogger("punch")
+
+# Log of a punch job: the records carry the job id, the card number and the
+# log callback of the job for the GUI sink
+class JobLog:
+    def __init__(self, file_path, gui = None):
+        self.logger = punch_logger()
+        self.job = f"{os.path.basename(file_path)}#{os.getpid()}.{next(_job_ids)}"
+        self.gui = gui
+
+    def log(self, level, msg, card = None):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, extra = {"job": self.job, "card": card, "gui": self.gui, "mono": time.monotonic()})
+
+    def debug(self, msg, card = None):
+        self.log(logging.DEBUG, msg, card)
+
+    def info(self, msg, card = None):
+        self.log(logging.INFO, msg, card)
+
+    def warning(self, msg, card = None):
+        self.log(logging.WARNING, msg, card)
+
+    def error(self, msg, card = None):
+        self.log(logging.ERROR, msg, card)
+
+if __name__ == "__main__":
+    # Show the records of a job, i.e. python3 punch_log.py deck.cd#1234.1
+    path = os.path.join(kLogDir, kLogFile)
+    try:
+        with open(path, "r", encoding = "utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if len(sys.argv) < 2 or entry.get("job") == sys.argv[1]:
+                    print(f"{entry['time']:.3f} {entry['level']:<7} {entry.get('job')} {entry['msg']}")
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# punch_metrics.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Throughput and latency of the punch jobs. For every card the punch loop
+# records the time from sending the card to its acknowledgement, the time to
+# write it to the serial port and the time the punch took for it (from when
+# it could start the card to its acknowledgement), in histograms with log
+# buckets like HdrHistogram (about 6% precision from 1 microsecond to hours).
+# At the end of a job the numbers are written to a Prometheus textfile and
+# appended as a JSON line to the metrics history, to compare the jobs.
+
+import os
+import sys
+import json
+import time
+from settings import get_setting
+
+kMetricsDir = "LOGS"
+kMetricsTextfile = "punch_metrics.prom"     # setting "metrics_textfile" to change it
+kMetricsHistory = "punch_metrics.jsonl"
+
+kSubBuckets = 16            # buckets in every power of 2
+kBucketCount = kSubBuckets * 40
+kQuantiles = (0.5, 0.9, 0.99, 1.0)
+
+# Values in seconds, counted in microsecond buckets. The buckets are a list
+# of fixed size, so reading them from another thread while recording is safe.
+class Histogram:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.buckets = [0] * kBucketCount
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(us):
+        if us < kSubBuckets:
+            return us
+        shift = us.bit_length() - kSubBuckets.bit_length()
+        return min(kBucketCount - 1, kSubBuckets * (shift + 1) + (us >> shift) - kSubBuckets)
+
+    # Lowest value of a bucket, in microseconds
+    @staticmethod
+    def _value(index):
+        if index < kSubBuckets:
+            return index
+        shift = index // kSubBuckets - 1
+        return (kSubBuckets + index % kSubBuckets) << shift
+
+    def record(self, seconds):
+        seconds = max(0.0, seconds)
+        self.buckets[self._index(int(seconds * 1e6))] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    # Value (seconds) at quantile q, 0 to 1
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        if q >= 1.0:
+            return self.max
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                # Middle of the bucket, within the values seen
+                low = self._value(index)
+                high = self._value(index + 1) if index + 1 < kBucketCount else low
+                return min(max((low + high) / 2e6, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": round(self.min or 0.0, 6),
+            "mean": round(self.mean, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self.max or 0.0, 6),
+        }
+
+# Metrics of one punch job
+class JobMetrics:
+    def __init__(self, job = None, port = None):
+        self.job = job
+        self.port = port
+        self.started = time.monotonic()
+        self.finished = None
+        self.cards = 0
+        self.bytes_sent = 0
+        self.resends = 0
+        self.timeouts = 0
+        self.corrupt_replies = 0
+        self.ack_latency = Histogram("punch_ack_latency_seconds", "Time from sending a card to its acknowledgement")
+        self.write_time = Histogram("punch_write_seconds", "Time to write a card to the serial port")
+        self.mechanical_time = Histogram("punch_card_seconds", "Time the punch took for a card")
+        self._sent = {}
+        self._last_ack = None
+
+    def start(self, job, port):
+        self.job = job
+        self.port = port
+        self.started = time.monotonic()
+
+    # Card with sequence number seq written in write_seconds
+    def card_sent(self, seq, size, write_seconds):
+        self._sent[seq] = time.monotonic()
+        self.bytes_sent += size
+        self.write_time.record(write_seconds)
+
+    def card_acked(self, seq):
+        now = time.monotonic()
+        sent = self._sent.pop(seq, None)
+        if sent is None:
+            return
+        self.cards += 1
+        self.ack_latency.record(now - sent)
+        # The punch starts a card when it is received or when the card
+        # before it is done, whichever comes last
+        self.mechanical_time.record(now - max(sent, self._last_ack or sent))
+        self._last_ack = now
+
+    def finish(self):
+        self.finished = time.monotonic()
+        self._sent.clear()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def cards_per_minute(self):
+        elapsed = self.elapsed
+        return self.cards * 60.0 / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def histograms(self):
+        return (self.ack_latency, self.write_time, self.mechanical_time)
+
+    def to_dict(self):
+        return {
+            "time": round(time.time(), 3),
+            "job": self.job,
+            "port": self.port,
+            "elapsed": round(self.elapsed, 3),
+            "cards": self.cards,
+            "cards_per_minute": round(self.cards_per_minute, 2),
+            "bytes_sent": self.bytes_sent,
+            "resends": self.resends,
+            "timeouts": self.timeouts,
+            "corrupt_replies": self.corrupt_replies,
+            "ack_latency": self.ack_latency.summary(),
+            "write_time": self.write_time.summary(),
+            "mechanical_time": self.mechanical_time.summary(),
+        }
+
+    # Prometheus text exposition format, for the node_exporter textfile collector
+    def to_prometheus(self):
+        return format_prometheus([self])
+
+    # The metrics of the job as (name, kind, help, sample lines), the samples
+    # labeled with the port
+    def samples(self):
+        labels = f'port="{self.port or ""}"'
+        metrics = []
+
+        def metric(name, kind, help, value):
+            metrics.append((name, kind, help, [f"{name}{{{labels}}} {value}"]))
+
+        # Values of the last job, reset by every job: gauges, not counters
+        metric("punch_job_cards", "gauge", "Cards punched by the last job", self.cards)
+        metric("punch_job_bytes_sent", "gauge", "Bytes of cards written to the serial port by the last job", self.bytes_sent)
+        metric("punch_job_resends", "gauge", "Cards sent again after a NAK in the last job", self.resends)
+        metric("punch_job_timeouts", "gauge", "Acknowledgement timeouts in the last job", self.timeouts)
+        metric("punch_job_corrupt_replies", "gauge", "Replies that could not be decoded in the last job", self.corrupt_replies)
+        metric("punch_cards_per_minute", "gauge", "Cards per minute of the last job", f"{self.cards_per_minute:.2f}")
+        metric("punch_job_seconds", "gauge", "Duration of the last job", f"{self.elapsed:.3f}")
+
+        for histogram in self.histograms:
+            lines = [f'{histogram.name}{{{labels},quantile="{q:g}"}} {histogram.quantile(q):.6f}' for q in kQuantiles]
+            lines.append(f"{histogram.name}_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{histogram.name}_count{{{labels}}} {histogram.count}")
+            metrics.append((histogram.name, "summary", histogram.help, lines))
+        return metrics
+
+    # Short text for the log and the stats panel
+    def format(self):
+        latency = self.ack_latency
+        return (f"{self.cards} cards in {self.elapsed:.1f} s, {self.cards_per_minute:.1f} cards/min, "
+                f"ack latency p50 {latency.quantile(0.5) * 1000:.0f} ms p99 {latency.quantile(0.99) * 1000:.0f} ms "
+                f"max {(latency.max or 0) * 1000:.0f} ms, write p99 {self.write_time.quantile(0.99) * 1000:.1f} ms, "
+                f"{self.resends} resends, {self.timeouts} timeouts")
+
+# Prometheus text of the jobs run at the same time (i.e. the punches of a
+# farm): every metric once, with a sample for each port
+def format_prometheus(jobs):
+    merged = {}
+    for job in jobs:
+        for name, kind, help, lines in job.samples():
+            merged.setdefault(name, (kind, help, []))[2].extend(lines)
+
+    text = []
+    for name, (kind, help, lines) in merged.items():
+        text.append(f"# HELP {name} {help}")
+        text.append(f"# TYPE {name} {kind}")
+        text.extend(lines)
+    return "\n".join(text) + "\n"
+
+# Write the metrics of a finished job, or of the jobs run together (a list):
+# Prometheus textfile (replaced) and one JSON line per job appended to the
+# history
+def export_metrics(metrics, metrics_dir = kMetricsDir):
+    jobs = metrics if isinstance(metrics, (list, tuple)) else [metrics]
+    os.makedirs(metrics_dir, exist_ok = True)
+    textfile = get_setting("metrics_textfile") or os.path.join(metrics_dir, kMetricsTextfile)
+    # Written aside and renamed, the collector never reads half a file
+    tmp_file = f"{textfile}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding = "utf-8") as f:
+        f.write(format_prometheus(jobs))
+    os.replace(tmp_file, textfile)
+
+    with open(os.path.join(metrics_dir, kMetricsHistory), "a", encoding = "utf-8") as f:
+        for job in jobs:
+            f.write(json.dumps(job.to_dict()) + "\n")
+
+# Metrics of the last jobs, from the history
+def read_history(metrics_dir = kMetricsDir, count = 20):
+    try:
+        with open(os.path.join(metrics_dir, kMetricsHistory), "r", encoding = "utf-8") as f:
+            lines = f.readlines()[-count:]
+    except OSError:
+        return []
+    jobs = []
+    for line in lines:
+        try:
+            jobs.append(json.loads(line))
+        except ValueError:
+            pass
+    return jobs
+
+if __name__ == "__main__":
+    # Throughput and latency of the last jobs, to spot a slowing punch
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for job in read_history(count = count):
+        latency = job["ack_latency"]
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(job['time']))} {job['port']} {job['job']}: "
+              f"{job['cards']} cards, {job['cards_per_minute']:.1f} cards/min, "
+              f"ack p50 {latency['p50'] * 1000:.0f} ms p99 {latency['p99'] * 1000:.0f} ms, "
+              f"{job['resends']} resends, {job['timeouts']} timeouts")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# punch_session.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Long-lived connection to the Arduino: opening the port resets the Mega 2560,
+# so the session keeps it open and the firmware started across punch jobs and
+# reconnects only when the link drops.
+
+import os
+import time
+import threading
+import serial
+from datetime import datetime
+from card_protocol import negotiate_baud, negotiate_protocol, kStartBaudRate
+from port_discovery import cached_port, discover_port, remember_port, forget_port
+
+# None finds the port automatically, or set it i.e.:
+# kUsbPort = 'COM4'    # at CHM
+# kUsbPort = 'COM13'   # at home
+# kUsbPort = "/dev/tty.usbserial-A50285BI" # for macOS
+kUsbPort = None
+
+# Use the framed binary protocol when the firmware supports it
+kBinaryProtocol = True
+
+# Highest baud rate to negotiate after the start handshake (None = keep 9600)
+kMaxBaudRate = 115200
+
+kSerialTimeout = 2.0    # seconds, blocking reads of the port
+kStartTimeout = 10.0    # seconds, start command response
+
+class PunchSession:
+    def __init__(self, port = None, binary = kBinaryProtocol, max_baud = kMaxBaudRate, timeout = kSerialTimeout):
+        # PUNCHER_PORT overrides the default, i.e. to use keypunch_emulator.py
+        self.port = port or os.environ.get("PUNCHER_PORT") or kUsbPort
+        # The port is found automatically at each connection
+        self.auto_port = self.port is None
+        self.binary = binary
+        self.max_baud = max_baud
+        self.timeout = timeout
+        self.ser = None
+        self.protocol = None
+        self.baud_rate = kStartBaudRate
+        self.start_reply = ""
+        self.next_seq = 0
+        self.connections = 0
+        self.jobs = 0
+        # The port failed during a job (unplugged, not a punch error)
+        self.link_lost = False
+        # Only one job at a time can use the session (a plain Lock, the async
+        # jobs acquire it on a worker thread and release it on the loop)
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def is_open(self):
+        return self.ser is not None and self.ser.is_open
+
+    # True if the port is open and the USB device is still there
+    def link_alive(self):
+        if not self.is_open:
+            return False
+        try:
+            self.ser.in_waiting
+            return True
+        except (serial.SerialException, OSError):
+            return False
+
+    # Open the port and start the firmware unless already done.
+    # Returns True if a new connection was made.
+    def ensure_open(self, log = None):
+        if self.link_alive():
+            return False
+        if self.ser is not None:
+            if log:
+                log(f"Connection to {self.port} dropped, reconnecting")
+            self.close()
+        self.open(log)
+        return True
+
+    def open(self, log = None):
+        def send_log(msg: str):
+            if log:
+                log(msg)
+
+        self.start_reply = ""
+        if self.auto_port:
+            self.port = cached_port()
+            if self.port is None:
+                # Not known yet or unplugged: probe the ports, the one that
+                # answers is already started
+                self.port, self.ser, self.start_reply = discover_port(log = send_log)
+                if self.port is None:
+                    raise serial.SerialException("No 029 punch found on the serial ports")
+
+        if self.ser is None:
+            # Open the serial port to the 029 arudino
+            try:
+                self.ser = serial.Serial(self.port, kStartBaudRate, timeout = self.timeout)
+            except serial.SerialException:
+                if self.auto_port:
+                    # The cached port is gone, probe again next time
+                    forget_port()
+                    self.port = None
+                raise
+        else:
+            self.ser.timeout = self.timeout
+        self.connections += 1
+        print(f"Connected to {self.port} at {kStartBaudRate} baud")
+
+        try:
+            if not self.start_reply:
+                # send the start command to the 029 arduino and print the response
+                self.ser.write("start   \n".encode('utf-8'))
+                print(f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')} Sent: Start command")
+                send_log("Sent: Start command")
+
+            deadline = time.monotonic() + kStartTimeout
+            while not self.start_reply:
+                if time.monotonic() > deadline:
+                    raise serial.SerialException(f"No response to the start command from {self.port}")
+
+                # Read a line from the serial port  the start  command response
+                msg = self.ser.readline()
+
+                # Check if any data was received
+                if msg:
+                    # Decode the received bytes to string (handle potential errors)
+                    try:
+                        self.start_reply = msg.decode('utf-8')
+                        print("Started Arduino program:", self.start_reply)
+                        send_log(f"Received: {self.start_reply} ")
+                        break
+                    except UnicodeDecodeError:
+                        print("Error decoding data")
+
+                else:
+                    print("Timeout: No data received")
+
+            # Negotiate a faster baud rate, 9600 is the fallback
+            self.baud_rate = negotiate_baud(self.ser, self.start_reply, self.port, max_baud = self.max_baud, log = send_log)
+            send_log(f"Baud rate: {self.baud_rate}")
+
+            # Negotiate the wire protocol, text is the fallback
+            self.protocol = negotiate_protocol(self.ser, self.start_reply, binary = self.binary, log = send_log)
+            send_log(f"Protocol: {self.protocol.name}")
+
+            self.next_seq = 0
+            self.link_lost = False
+
+            if self.auto_port:
+                remember_port(self.port)
+
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.ser is not None:
+            try:
+                if self.ser.is_open:
+                    self.ser.close()
+                    print("Serial port closed.")
+            except (serial.SerialException, OSError):
+                pass
+        self.ser = None
+        self.protocol = None
+        if self.auto_port:
+            self.port = None
+
+    # Sequence number of the next frame sent to the firmware
+    def next_sequence(self):
+        seq = self.next_seq
+        self.next_seq = (seq + 1) & 0xFFFF
+        return seq
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# puncher.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Command line puncher for scripts, cron and the kiosk: punches one or more
+# decks on one connection without the GUI (PyQt5 is never imported).
+#   python3 puncher.py deck1.cd deck2.cd:10-20 --port COM4
+# Every deck is checked before the port is opened; --dry-run stops there.
+# A deck "-" (or a FIFO) is a stream of cards punched as they come:
+#   some_converter | python3 puncher.py - --port COM4
+# With --json the progress is written on stdout as one JSON object per line
+# and the punch log goes to stderr.
+# Exit codes: 0 all the cards punched, 1 a deck not punched completely,
+# 2 bad arguments, 3 deck not found or with cards that cannot be punched,
+# 4 punch not connected, 130 interrupted.
+# The engine modules (asyncio, numpy, serial) are imported only when needed,
+# so --help and the argument errors answer at once.
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+
+kExitOk = 0
+kExitNotPunched = 1
+kExitUsage = 2
+kExitDeckError = 3
+kExitPortError = 4
+kExitInterrupted = 130
+
+kMaxBaudRate = 115200       # as punch_session.kMaxBaudRate
+
+# deck.cd:10-20
+kDeckRange = re.compile(r"^(.+):(\d+)-(\d+)$")
+
+def parse_range(text):
+    match = re.fullmatch(r"(\d+)-(\d+)", text or "")
+    if not match or int(match.group(1)) < 1 or int(match.group(1)) > int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"invalid range {text}, i.e. 10-20")
+    return int(match.group(1)), int(match.group(2))
+
+# Path and range of a deck argument (the range is None if not given)
+def parse_deck(arg):
+    match = kDeckRange.match(arg)
+    if match and arg != "-" and not os.path.exists(arg):
+        return match.group(1), parse_range(f"{match.group(2)}-{match.group(3)}")
+    return arg, None
+
+class Output:
+    def __init__(self, json_lines):
+        self.json_lines = json_lines
+        self.stdout = sys.stdout
+        self.lock = threading.Lock()
+        if json_lines:
+            # Only the events on stdout, what the engine prints goes to stderr
+            sys.stdout = sys.stderr
+
+    # One event: a JSON line on stdout, or a line of text
+    def event(self, name, text, **fields):
+        with self.lock:
+            if self.json_lines:
+                print(json.dumps({"event": name, "time": round(time.time(), 3), **fields}), file = self.stdout, flush = True)
+            else:
+                print(text, file = self.stdout, flush = True)
+
+    # Messages of the connection, not events
+    def log(self, msg):
+        print(msg, flush = True)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Punch card decks on the IBM 029 without the GUI.",
+                                     epilog = "Exit codes: 0 all punched, 1 not all punched, 2 bad arguments, "
+                                              "3 deck errors, 4 punch not connected, 130 interrupted.")
+    parser.add_argument("decks", nargs = "+", help = "decks to punch, deck.cd or deck.cd:FIRST-LAST for some rows, - for stdin")
+    parser.add_argument("--range", type = parse_range, help = "rows to punch of every deck, i.e. 10-20 (default: all)")
+    parser.add_argument("--port", help = "serial port (default: PUNCHER_PORT or found automatically)")
+    parser.add_argument("--baud", type = int, default = kMaxBaudRate, help = f"highest baud rate to negotiate (default {kMaxBaudRate}, 0 to stay at 9600)")
+    parser.add_argument("--text", action = "store_true", help = "use the text protocol even if the firmware has the binary one")
+    parser.add_argument("--window", type = int, default = 1, help = "cards sent ahead of their acknowledgement (default 1)")
+    parser.add_argument("--dry-run", action = "store_true", help = "check the decks and show what would be punched, do not punch")
+    parser.add_argument("--no-check", action = "store_true", help = "skip the pre-flight check of the cards")
+    parser.add_argument("--resume", action = "store_true", help = "continue interrupted jobs after their last card")
+    parser.add_argument("--follow", action = "store_true", help = "punch the cards appended to the deck while punching")
+    parser.add_argument("--keep-going", action = "store_true", help = "punch the next decks after a deck not punched completely")
+    parser.add_argument("--json", action = "store_true", help = "progress as JSON lines on stdout, the log on stderr")
+    parser.add_argument("-q", "--quiet", action = "store_true", help = "log only warnings and errors")
+    parser.add_argument("-v", "--verbose", action = "store_true", help = "log every card")
+    args = parser.parse_args(argv)
+
+    import logging
+    import punch_log
+    from card_index import count_rows
+    from deck_validate import validate_deck
+    from deck_stream import is_stream
+
+    if args.decks.count("-") > 1:
+        parser.error("stdin (-) can be punched only once")
+
+    out = Output(args.json)
+    level = logging.DEBUG if args.verbose else logging.WARNING if args.quiet or args.json else None
+    punch_log.set_console(sys.stderr if args.json else None, level)
+
+    # Pre-flight check of all the decks before the port is opened
+    jobs = []
+    deck_errors = 0
+    for arg in args.decks:
+        path, row_range = parse_deck(arg)
+        if is_stream(path):
+            # Not known in advance, the cards are punched as they come
+            row_range = row_range or args.range
+            name = "stdin" if path == "-" else path
+            if row_range:
+                text = f"{name}: rows {row_range[0]} to {row_range[1]} of the stream"
+            else:
+                text = f"{name}: all the cards of the stream"
+            jobs.append((path, row_range, row_range is None))
+            out.event("planned", text, deck = path, range = list(row_range) if row_range else None, cards = None, stream = True)
+            continue
+
+        if not os.path.isfile(path):
+            out.event("deck_error", f"{path}: not found", deck = path, error = "not found")
+            deck_errors += 1
+            continue
+
+        rows = count_rows(path)
+        first, last = row_range or args.range or (1, rows)
+        last = min(last, rows)
+        if first > last and not args.follow:
+            out.event("deck_error", f"{path}: no rows {first} to {last} in {rows} rows", deck = path, error = "empty range", rows = rows)
+            deck_errors += 1
+            continue
+
+        if not args.no_check and not args.follow:
+            report = validate_deck(path, (first, last))
+            out.event("checked", report.format(limit = 20), deck = path, rows = rows, errors = report.errors,
+                      warnings = report.warnings, counts = report.counts)
+            if not report.ok:
+                deck_errors += 1
+                continue
+        jobs.append((path, (first, last), (first, last) == (1, rows)))
+        out.event("planned", f"{path}: rows {first} to {last} ({last - first + 1} cards)", deck = path, range = [first, last], cards = last - first + 1)
+
+    if deck_errors:
+        out.event("summary", f"Not punched: {deck_errors} deck(s) with errors", punched = 0, exit_code = kExitDeckError)
+        return kExitDeckError
+    if args.dry_run:
+        out.event("summary", f"Dry run: {len(jobs)} deck(s), {sum(r[1] - r[0] + 1 for _, r, _ in jobs if r)} cards to punch",
+                  punched = 0, exit_code = kExitOk)
+        return kExitOk
+
+    import serial
+    from CDto029b import punch_file
+    from punch_session import PunchSession, kBinaryProtocol
+
+    # Ctrl-C stops after the card being punched, a second one right away
+    stop_event = threading.Event()
+
+    def interrupt(sig, frame):
+        stop_event.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        out.log("Stopping after the current card (Ctrl-C again to quit now)")
+
+    signal.signal(signal.SIGINT, interrupt)
+
+    total_punched = 0
+    exit_code = kExitOk
+    with PunchSession(args.port, binary = kBinaryProtocol and not args.text, max_baud = args.baud) as session:
+        try:
+            session.ensure_open(out.log)
+        except (serial.SerialException, OSError) as e:
+            out.event("port_error", f"Punch not connected: {e}", error = str(e), exit_code = kExitPortError)
+            return kExitPortError
+        out.event("connected", f"Connected to {session.port} at {session.baud_rate} baud, {session.protocol.name} protocol",
+                  port = session.port, baud = session.baud_rate, protocol = session.protocol.name)
+
+        for path, row_range, punch_all in jobs:
+            if stop_event.is_set():
+                exit_code = kExitInterrupted
+                break
+
+            # Updated at every card (a resumed job has fewer cards to punch)
+            punched = [0, row_range[1] - row_range[0] + 1 if row_range else 0]
+
+            def progress(count, total):
+                punched[:] = [count, total]
+                if args.json:
+                    out.event("progress", "", deck = path, punched = count, total = total)
+
+            rows_text = f"rows {row_range[0]} to {row_range[1]}" if row_range else "all the cards"
+            out.event("start", f"Punching {path} {rows_text}", deck = path, range = list(row_range) if row_range else None)
+            start = time.monotonic()
+            # Ctrl-C during the job leaves stop_event set
+            report, aborted, done_range = punch_file(path, range = row_range, punch_all = punch_all, session = session,
+                                                     stop_event = stop_event, progress = progress, resume = args.resume,
+                                                     follow = args.follow, validate = False, window = args.window)
+            complete = not aborted and punched[0] == punched[1]
+            total_punched += punched[0]
+            out.event("done", report, deck = path, complete = complete, aborted = aborted, punched = punched[0],
+                      total = punched[1], range = list(done_range), seconds = round(time.monotonic() - start, 3))
+
+            if stop_event.is_set():
+                exit_code = kExitInterrupted
+                break
+            if not complete:
+                # A punch error closes the session too, only a dropped link
+                # is a port error
+                exit_code = kExitPortError if session.link_lost else kExitNotPunched
+                if not args.keep_going:
+                    break
+
+    out.event("summary", f"{total_punched} card(s) punched", punched = total_punched, exit_code = exit_code)
+    return exit_code
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+
+    except KeyboardInterrupt:
+        print("\nProgram Interrupted.", file = sys.stderr)
+        sys.exit(kExitInterrupted)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# settings.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Small persistent settings and caches, stored as JSON in the user folder.
+
+import os
+import json
+import threading
+
+kSettingsDir = os.path.join(os.path.expanduser("~"), ".029-puncher")
+kSettingsFile = os.path.join(kSettingsDir, "settings.json")
+
+_lock = threading.Lock()
+
+def load_settings():
+    try:
+        with open(kSettingsFile, "r", encoding = "utf-8") as f:
+            settings = json.load(f)
+            return settings if isinstance(settings, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_settings(settings):
+    os.makedirs(kSettingsDir, exist_ok = True)
+    tmp_file = f"{kSettingsFile}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding = "utf-8") as f:
+        json.dump(settings, f, indent = 2, sort_keys = True)
+    os.replace(tmp_file, kSettingsFile)
+
+def get_setting(key, default = None):
+    return load_settings().get(key, default)
+
+def set_setting(key, value):
+    with _lock:
+        settings = load_settings()
+        if value is None:
+            settings.pop(key, None)
+        else:
+            settings[key] = value
+        try:
+            save_settings(settings)
+        except OSError as e:
+            print(f"Could not save settings: {e}")
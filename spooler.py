@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# spooler.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Punch spooler: a persistent queue of decks (file + range of rows) fed
+# back-to-back to the punch by a dispatcher running on the punch event loop.
+# The queue is stored in the settings folder, so the GUI and the command line
+# can both add decks and a queue survives a restart of the program.
+#
+# The next deck is chosen by the scheduling policy:
+#   fifo      in order of submission
+#   priority  highest priority first, then in order of submission
+#   sjf       shortest job first by number of cards, then in order of submission
+#
+# A deck that gets interrupted or fails pauses the spooler: the punch needs
+# attention before the next deck goes in.
+#
+# Every change of the spool file is made under a lock of the file shared by
+# the processes (spool.json.lock), and a deck is taken by a dispatcher in the
+# same change that marks it running with the pid of the process, so two
+# dispatchers never punch the same deck.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import functools
+import contextlib
+from settings import kSettingsDir
+from punch_async import get_runner
+from card_index import count_rows
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+kSpoolFile = os.path.join(kSettingsDir, "spool.json")
+
+kPolicyFifo = "fifo"
+kPolicyPriority = "priority"
+kPolicySjf = "sjf"
+kPolicies = (kPolicyFifo, kPolicyPriority, kPolicySjf)
+kDefaultPolicy = kPolicyFifo
+
+# Job states
+kJobQueued = "queued"
+kJobRunning = "running"
+kJobDone = "done"
+kJobInterrupted = "interrupted"
+kJobFailed = "failed"
+kJobCancelled = "cancelled"
+
+kSpoolPollInterval = 2.0 # seconds, checks the spool file for decks added by other programs
+
+class SpoolJob:
+    def __init__(self, job_id, file_path, range, punch_all, cards, priority = 0):
+        self.id = job_id
+        self.file_path = file_path
+        self.range = tuple(range)
+        self.punch_all = punch_all
+        self.cards = cards
+        self.priority = priority
+        self.state = kJobQueued
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.report = ""
+        # Continue after the last card in the journal
+        self.resume = False
+        # Pid of the process punching the job
+        self.owner = None
+
+    def __repr__(self):
+        return f"SpoolJob({self.id}, {os.path.basename(self.file_path)}, {self.range}, {self.state})"
+
+    def to_dict(self):
+        d = dict(self.__dict__)
+        d["range"] = list(self.range)
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        job = cls(d["id"], d["file_path"], d["range"], d["punch_all"], d["cards"], d.get("priority", 0))
+        for key in ("state", "submitted", "started", "finished", "report", "resume", "owner"):
+            if key in d:
+                setattr(job, key, d[key])
+        return job
+
+# Lock of the spool file between the processes, held while it is read,
+# changed and written
+@contextlib.contextmanager
+def spool_lock(spool_file):
+    os.makedirs(os.path.dirname(spool_file), exist_ok = True)
+    with open(f"{spool_file}.lock", "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Is the process with this pid running?
+def pid_alive(pid):
+    if sys.platform == "win32":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ok = kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        # STILL_ACTIVE
+        return bool(ok) and code.value == 259
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+# Sort key of the queued jobs for a policy
+def policy_key(policy):
+    if policy == kPolicyPriority:
+        return lambda job: (-job.priority, job.submitted, job.id)
+    if policy == kPolicySjf:
+        return lambda job: (job.cards, job.submitted, job.id)
+    return lambda job: (job.submitted, job.id)
+
+class Spooler:
+    def __init__(self, session = None, policy = kDefaultPolicy, spool_file = None, log = None, on_change = None, stop_event = None):
+        if policy not in kPolicies:
+            raise ValueError(f"Unknown spooler policy: {policy}")
+        self.session = session
+        self.policy = policy
+        self.spool_file = spool_file or kSpoolFile
+        self.log = log
+        self.on_change = on_change
+        self.stop_event = stop_event
+        self.paused = False
+        self.current = None
+        self.next_id = 1
+        self.future = None
+        self.loop = None
+        self.wakeup = None
+        self.stopping = False
+        self.dispatching = False
+        self.lock = threading.Lock()
+        # Taken to start the dispatcher and by the dispatcher to end
+        self.start_lock = threading.Lock()
+
+    def send_log(self, msg):
+        print(msg)
+        if self.log:
+            self.log(msg)
+
+    def changed(self):
+        if self.on_change:
+            self.on_change()
+
+    # The spool file is the queue: it is read and written at every change
+    def _load(self):
+        try:
+            with open(self.spool_file, "r", encoding = "utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        jobs = [SpoolJob.from_dict(d) for d in data.get("jobs", [])]
+        return data.get("next_id", 1), jobs
+
+    def _save(self, next_id, jobs):
+        os.makedirs(os.path.dirname(self.spool_file), exist_ok = True)
+        tmp_file = f"{self.spool_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding = "utf-8") as f:
+            json.dump({"next_id": next_id, "jobs": [job.to_dict() for job in jobs]}, f, indent = 2)
+        os.replace(tmp_file, self.spool_file)
+
+    # Apply change(jobs) to the stored queue, returns what change returns
+    def _update(self, change):
+        with self.lock, spool_lock(self.spool_file):
+            self.next_id, jobs = self._load()
+            result = change(jobs)
+            self._save(self.next_id, jobs)
+        self.changed()
+        return result
+
+    def jobs(self):
+        with self.lock:
+            return self._load()[1]
+
+    # Queued jobs in the order they will be punched
+    def queued(self):
+        jobs = [job for job in self.jobs() if job.state == kJobQueued]
+        return sorted(jobs, key = policy_key(self.policy))
+
+    # Add a deck to the queue. range is (first row, last row), all the file if None.
+    def submit(self, file_path, range = None, priority = 0):
+        file_path = os.path.abspath(file_path)
+        rows = count_rows(file_path)
+        if range is None:
+            range = (1, rows)
+        start_row, end_row = range
+        if not (1 <= start_row <= end_row <= rows):
+            raise ValueError(f"Invalid range of rows {start_row} to {end_row} for {os.path.basename(file_path)} ({rows} rows)")
+        punch_all = (end_row - start_row + 1) == rows
+
+        def add(jobs):
+            job = SpoolJob(self.next_id, file_path, range, punch_all, end_row - start_row + 1, priority)
+            self.next_id += 1
+            jobs.append(job)
+            return job
+
+        job = self._update(add)
+        self.send_log(f"Spooled deck {job.id}: {os.path.basename(file_path)} rows {start_row} to {end_row} ({job.cards} cards)")
+        self.wake()
+        return job
+
+    # Remove a queued job, or stop it if it is being punched
+    def cancel(self, job_id):
+        if self.current is not None and self.current.id == job_id:
+            self.stop_current()
+            return True
+
+        def cancel_job(jobs):
+            for job in jobs:
+                if job.id == job_id and job.state == kJobQueued:
+                    job.state = kJobCancelled
+                    return True
+            return False
+
+        return self._update(cancel_job)
+
+    # Forget the jobs that are not queued or running
+    def clear(self):
+        def clear_jobs(jobs):
+            jobs[:] = [job for job in jobs if job.state in (kJobQueued, kJobRunning)]
+
+        self._update(clear_jobs)
+
+    def set_policy(self, policy):
+        if policy not in kPolicies:
+            raise ValueError(f"Unknown spooler policy: {policy}")
+        self.policy = policy
+        self.changed()
+
+    def stop_current(self):
+        from CDto029b import punching_stopped
+        (self.stop_event or punching_stopped).set()
+
+    def pause(self):
+        self.paused = True
+        self.changed()
+
+    def resume(self):
+        self.paused = False
+        self.changed()
+        self.wake()
+
+    # Wake up the dispatcher, from any thread
+    def wake(self):
+        if self.loop is not None and self.wakeup is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    # Start the dispatcher on the punch event loop (see run for until_empty)
+    def start(self, until_empty = False):
+        with self.start_lock:
+            if not self.dispatching:
+                self.dispatching = True
+                self.stopping = False
+                self.future = get_runner().submit(self.run(until_empty))
+        return self.future
+
+    # Stop the dispatcher after the current job
+    def stop(self):
+        self.stopping = True
+        self.wake()
+
+    def _set_state(self, job, **values):
+        def set_state(jobs):
+            for stored in jobs:
+                if stored.id == job.id:
+                    for key, value in values.items():
+                        setattr(stored, key, value)
+                        setattr(job, key, value)
+
+        self._update(set_state)
+
+    # Dispatcher: punches the queued decks one after the other.
+    # With until_empty it returns when the queue is empty (or the spooler is
+    # paused), otherwise it waits for new decks until stopped, checking the
+    # spool file every kSpoolPollInterval for decks added by other programs.
+    async def run(self, until_empty = False):
+        self.dispatching = True
+        try:
+            await self._dispatch(until_empty)
+        except BaseException:
+            self.dispatching = False
+            raise
+        finally:
+            self.loop = None
+
+    async def _dispatch(self, until_empty):
+        from CDto029b import punch_file_async
+        from punch_session import PunchSession
+
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+
+        # Jobs left running by a process that is gone (or by a previous
+        # dispatcher of this one) did not complete, they continue after the
+        # last card they punched. The jobs of the other dispatchers running
+        # are theirs.
+        def requeue(jobs):
+            for job in jobs:
+                if job.state == kJobRunning and (job.owner is None or job.owner == os.getpid() or not pid_alive(job.owner)):
+                    job.state = kJobQueued
+                    job.resume = True
+                    job.owner = None
+
+        # The first queued job, marked running by this process
+        def claim(jobs):
+            queued = sorted((job for job in jobs if job.state == kJobQueued), key = policy_key(self.policy))
+            if not queued:
+                return None, 0
+            job = queued[0]
+            job.state = kJobRunning
+            job.started = time.time()
+            job.owner = os.getpid()
+            return job, len(queued) - 1
+
+        # The next deck to punch, (None, 0) if none, or None to stop
+        def take():
+            with self.start_lock:
+                job, more = None, 0
+                # Read first, the spool file is written only to take a deck
+                if not self.paused and not self.stopping and self.queued():
+                    job, more = self._update(claim)
+                # From here a deck submitted starts a new dispatcher
+                if self.stopping or (until_empty and job is None):
+                    self.dispatching = False
+                    return None
+                return job, more
+
+        # The spool file is read, locked and fsync'd on a worker thread, the
+        # loop is shared with the other jobs
+        await self.loop.run_in_executor(None, self._update, requeue)
+
+        if self.session is None:
+            self.session = PunchSession()
+
+        while True:
+            taken = await self.loop.run_in_executor(None, take)
+            if taken is None:
+                break
+            job, more = taken
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), kSpoolPollInterval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.current = job
+            self.changed()
+            self.send_log(f"Punching deck {job.id}: {os.path.basename(job.file_path)} ({job.cards} cards, {more} more queued)")
+
+            try:
+                report, aborted, _ = await punch_file_async(job.file_path, range = job.range, punch_all = job.punch_all, log = self.log,
+                                                            session = self.session, stop_event = self.stop_event,
+                                                            resume = job.resume)
+                state = kJobInterrupted if aborted else kJobDone
+            except Exception as e:
+                report, state = f"Punch error: {e}", kJobFailed
+
+            self.current = None
+            await self.loop.run_in_executor(None, functools.partial(self._set_state, job, state = state, finished = time.time(),
+                                                                    report = report))
+            self.send_log(f"Deck {job.id} {state}.")
+
+            if state != kJobDone:
+                self.paused = True
+                self.send_log("Spooler paused.")
+                self.changed()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "029 Puncher spooler")
+    parser.add_argument("--policy", choices = kPolicies, default = kDefaultPolicy, help = "scheduling policy")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    add_cmd = commands.add_parser("add", help = "add decks to the queue")
+    add_cmd.add_argument("files", nargs = "+")
+    add_cmd.add_argument("--range", help = "rows to punch, i.e. 10-20")
+    add_cmd.add_argument("--priority", type = int, default = 0)
+
+    commands.add_parser("list", help = "show the queue")
+
+    cancel_cmd = commands.add_parser("cancel", help = "cancel queued decks")
+    cancel_cmd.add_argument("ids", nargs = "+", type = int)
+
+    commands.add_parser("clear", help = "forget the decks already punched")
+
+    commands.add_parser("run", help = "punch the queued decks")
+
+    args = parser.parse_args()
+
+    spooler = Spooler(policy = args.policy)
+
+    try:
+        if args.command == "add":
+            row_range = tuple(int(n) for n in args.range.split("-")) if args.range else None
+            for file in args.files:
+                spooler.submit(file, range = row_range, priority = args.priority)
+
+        elif args.command == "list":
+            queued = spooler.queued()
+            for position, job in enumerate(queued, 1):
+                print(f"{position:3}. deck {job.id}: {job.file_path} rows {job.range[0]} to {job.range[1]} ({job.cards} cards, priority {job.priority})")
+            for job in spooler.jobs():
+                if job.state != kJobQueued:
+                    print(f"     deck {job.id}: {job.file_path} {job.state}")
+
+        elif args.command == "cancel":
+            for job_id in args.ids:
+                if not spooler.cancel(job_id):
+                    print(f"Deck {job_id} is not queued")
+
+        elif args.command == "clear":
+            spooler.clear()
+
+        elif args.command == "run":
+            from punch_session import PunchSession
+            with PunchSession() as session:
+                spooler.session = session
+                asyncio.run(spooler.run(until_empty = True))
+
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    except KeyboardInterrupt:
+        print("\nProgram Interrupted.")
+        sys.exit(1)
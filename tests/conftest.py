@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# tests/conftest.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# The tests punch on keypunch_emulator.py (a pty, Linux and macOS only) with
+# the settings, the journal and the LOGS folder in a temporary folder.
+
+import os
+import sys
+import signal
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings
+import punch_journal
+
+needs_pty = pytest.mark.skipif(sys.platform == "win32", reason = "the emulator needs a pty")
+
+@pytest.fixture(autouse = True)
+def isolated(tmp_path, monkeypatch):
+    settings_dir = tmp_path / "settings"
+    monkeypatch.setattr(settings, "kSettingsDir", str(settings_dir))
+    monkeypatch.setattr(settings, "kSettingsFile", str(settings_dir / "settings.json"))
+    monkeypatch.setattr(punch_journal, "kJournalDir", str(settings_dir / "journal"))
+    monkeypatch.delenv("PUNCHER_PORT", raising = False)
+    monkeypatch.chdir(tmp_path)
+    # puncher.main() installs its own Ctrl-C handler
+    handler = signal.getsignal(signal.SIGINT)
+    yield tmp_path
+    signal.signal(signal.SIGINT, handler)
+
+# Deck of cards numbered from 1
+@pytest.fixture
+def make_deck(tmp_path):
+    def make(cards, name = "deck.cd"):
+        path = tmp_path / name
+        with open(path, "w") as f:
+            for number in range(1, cards + 1):
+                f.write(f"CARD {number}\n")
+        return str(path)
+    return make
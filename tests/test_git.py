@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# tests/test_git.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+import shutil
+import subprocess
+import pytest
+from git import _parse_commit, iter_commits
+
+needs_git = pytest.mark.skipif(shutil.which("git") is None, reason = "git not installed")
+
+def test_parse_commit():
+    record = ("0123abc\x1fLuca\x1f2026-10-18T10:00:00+02:00\x1fFix the spooler\n\n\nDetails\n\x1f"
+              "\nM\0spooler.py\0R100\0old.py\0new.py\0A\0tests/test_git.py\0")
+    commit = _parse_commit(record)
+    assert commit["hash"] == "0123abc"
+    assert commit["author"] == "Luca"
+    assert commit["subject"] == "Fix the spooler\nDetails"
+    assert commit["files"] == [
+        {"status": "Modified", "path": "spooler.py"},
+        {"status": "Renamed", "old_path": "old.py", "path": "new.py"},
+        {"status": "Added", "path": "tests/test_git.py"},
+    ]
+
+def test_parse_commit_incomplete():
+    assert _parse_commit("") is None
+    assert _parse_commit("0123abc\x1fLuca") is None
+    # A commit with no files (i.e. a merge)
+    assert _parse_commit("0123abc\x1fLuca\x1fdate\x1fMerge\x1f")["files"] == []
+
+@needs_git
+def test_iter_commits(tmp_path):
+    def git(*args):
+        subprocess.run(["git", "-c", "user.name=Tester", "-c", "user.email=tester@example.com", *args],
+                       cwd = tmp_path, check = True, capture_output = True)
+
+    git("init", "-q")
+    (tmp_path / "deck.cd").write_text("CARD 1\n")
+    git("add", "deck.cd")
+    git("commit", "-q", "-m", "Add the deck")
+    git("mv", "deck.cd", "cards.cd")
+    (tmp_path / "notes.txt").write_text("Perforatrice à cartes\n")
+    git("add", "notes.txt")
+    git("commit", "-q", "-m", "Rename the deck, add the notes é")
+
+    commits = list(iter_commits("HEAD", cwd = str(tmp_path)))
+    assert [commit["subject"] for commit in commits] == ["Rename the deck, add the notes é", "Add the deck"]
+    assert all(commit["author"] == "Tester" for commit in commits)
+    assert commits[0]["files"] == [
+        {"status": "Renamed", "old_path": "deck.cd", "path": "cards.cd"},
+        {"status": "Added", "path": "notes.txt"},
+    ]
+    assert commits[1]["files"] == [{"status": "Added", "path": "deck.cd"}]
+
+@needs_git
+def test_iter_commits_bad_range(tmp_path):
+    subprocess.run(["git", "init", "-q"], cwd = tmp_path, check = True)
+    with pytest.raises(subprocess.CalledProcessError):
+        list(iter_commits("no-such-branch", cwd = str(tmp_path)))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# tests/test_punch.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+import time
+import pytest
+import punch_journal
+from conftest import needs_pty
+from keypunch_emulator import KeypunchEmulator, kEojReply
+from CDto029b import punch_file
+
+pytestmark = needs_pty
+
+@pytest.mark.parametrize("binary", [False, True])
+@pytest.mark.parametrize("window", [1, 4])
+def test_punch_all(make_deck, binary, window):
+    deck = make_deck(105)
+    with KeypunchEmulator(speed = 0, binary = binary) as emulator:
+        report, aborted, done = punch_file(deck, range = (1, 105), port = emulator.port, window = window, binary = binary)
+        assert not aborted
+        assert done == (1, 105)
+        assert emulator.cards_punched == 105
+    assert "File punched completely." in report
+    # Nothing to resume
+    assert punch_journal.pending_jobs() == []
+
+# With a window the firmware punches the cards it has after the one that
+# failed: they are counted and journaled, not punched again on resume
+@pytest.mark.parametrize("binary", [False, True])
+def test_error_with_window(make_deck, binary):
+    deck = make_deck(105)
+    with KeypunchEmulator(speed = 0, binary = binary, error_cards = {50}) as emulator:
+        report, aborted, done = punch_file(deck, range = (1, 105), port = emulator.port, window = 4, binary = binary)
+        time.sleep(0.2)
+        punched = emulator.cards_punched
+    assert aborted
+    assert done == (1, 49)
+    assert "punch card 50 again" in report
+    # 49 before the error and those still in flight after it
+    assert punched > 49
+    journal = punch_journal.find_journal(deck, (1, 105))
+    assert journal.last_card == punched + 1
+
+    with KeypunchEmulator(speed = 0, binary = binary) as emulator:
+        report, aborted, done = punch_file(deck, range = (1, 105), port = emulator.port, window = 4, binary = binary, resume = True)
+        assert not aborted
+        assert done == (journal.last_card + 1, 105)
+        assert emulator.cards_punched == 105 - journal.last_card
+    assert punch_journal.find_journal(deck, (1, 105)) is None
+
+def test_resume(make_deck):
+    deck = make_deck(60)
+    with KeypunchEmulator(speed = 0, error_cards = {25}) as emulator:
+        _, aborted, done = punch_file(deck, range = (1, 60), port = emulator.port)
+    assert aborted
+    assert done == (1, 24)
+    assert punch_journal.find_journal(deck, (1, 60)).last_card == 24
+
+    with KeypunchEmulator(speed = 0) as emulator:
+        report, aborted, done = punch_file(deck, range = (1, 60), port = emulator.port, resume = True)
+        assert not aborted
+        assert done == (25, 60)
+        assert emulator.cards_punched == 36
+    assert "File punched completely." in report
+
+# A garbled EOJ response ends the job at once, not after the EOJ timeout
+@pytest.mark.parametrize("binary", [False, True])
+def test_garbled_eoj(make_deck, binary):
+    deck = make_deck(20)
+    with KeypunchEmulator(speed = 0, binary = binary) as emulator:
+        reply, reply_frame = emulator._reply, emulator._reply_frame
+
+        def garbled_reply(text):
+            if text == kEojReply:
+                emulator._write(b"\xff\xfe\r\n")
+            else:
+                reply(text)
+
+        def garbled_frame(frame_type, seq, text = ""):
+            if text == kEojReply:
+                emulator._write(b"\x01\x02\x03\x00")
+            else:
+                reply_frame(frame_type, seq, text)
+
+        emulator._reply, emulator._reply_frame = garbled_reply, garbled_frame
+        start = time.monotonic()
+        _, aborted, done = punch_file(deck, range = (1, 20), port = emulator.port, binary = binary)
+    assert not aborted
+    assert done == (1, 20)
+    assert time.monotonic() - start < 10
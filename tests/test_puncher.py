@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# tests/test_puncher.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+import os
+import sys
+import json
+import signal
+import threading
+import pytest
+import serial
+import punch_async
+import puncher
+from conftest import needs_pty
+from keypunch_emulator import KeypunchEmulator
+
+def test_bad_arguments(make_deck):
+    deck = make_deck(5)
+    with pytest.raises(SystemExit) as exit:
+        puncher.main([deck, "--range", "9-3"])
+    assert exit.value.code == puncher.kExitUsage
+
+def test_deck_errors(make_deck, tmp_path):
+    assert puncher.main([str(tmp_path / "missing.cd")]) == puncher.kExitDeckError
+    deck = make_deck(5)
+    with open(deck, "a") as f:
+        f.write("X" * 90 + "\n")
+    assert puncher.main([deck]) == puncher.kExitDeckError
+    assert puncher.main([f"{make_deck(5, 'short.cd')}:10-20"]) == puncher.kExitDeckError
+
+def test_dry_run(make_deck, capsys, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    deck = make_deck(30)
+    assert puncher.main([deck, f"{deck}:5-9", "--dry-run", "--json"]) == puncher.kExitOk
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [event["event"] for event in events] == ["checked", "planned", "checked", "planned", "summary"]
+    assert events[1]["cards"] == 30
+    assert events[3]["range"] == [5, 9]
+
+def test_port_error(make_deck, tmp_path):
+    assert puncher.main([make_deck(5), "--port", str(tmp_path / "no-port")]) == puncher.kExitPortError
+
+@needs_pty
+def test_punched(make_deck, capsys, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    deck = make_deck(40)
+    with KeypunchEmulator(speed = 0) as emulator:
+        assert puncher.main([deck, f"{deck}:1-10", "--port", emulator.port, "--window", "4", "--json"]) == puncher.kExitOk
+        assert emulator.cards_punched == 50
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert events[-1] == {"event": "summary", "time": events[-1]["time"], "punched": 50, "exit_code": 0}
+
+@needs_pty
+def test_punch_error(make_deck):
+    deck = make_deck(40)
+    with KeypunchEmulator(speed = 0, error_cards = {20}) as emulator:
+        assert puncher.main([deck, "--port", emulator.port, "--window", "4"]) == puncher.kExitNotPunched
+
+# The port failing while punching is a port error, not a card that failed
+@needs_pty
+def test_link_dropped(make_deck, monkeypatch):
+    write = punch_async.SerialStream.write
+    writes = []
+
+    async def failing_write(self, data):
+        writes.append(data)
+        if len(writes) > 10:
+            raise serial.SerialException("device disconnected")
+        return await write(self, data)
+
+    monkeypatch.setattr(punch_async.SerialStream, "write", failing_write)
+    deck = make_deck(40)
+    with KeypunchEmulator(speed = 0) as emulator:
+        assert puncher.main([deck, "--port", emulator.port]) == puncher.kExitPortError
+
+@needs_pty
+def test_interrupted(make_deck):
+    deck = make_deck(200)
+    with KeypunchEmulator(speed = 20) as emulator:
+        threading.Timer(1.0, os.kill, (os.getpid(), signal.SIGINT)).start()
+        assert puncher.main([deck, deck, "--port", emulator.port]) == puncher.kExitInterrupted
+        assert 0 < emulator.cards_punched < 200
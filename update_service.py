@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# 029 Puncher
+# update_service.py (10-18-2026)
+# By Luca Severini (lucaseverini@mac.com)
+
+# Update check in the background. The remote is fetched at most every
+# update_check_hours (the time of the last fetch is kept in the settings);
+# between fetches the repo is only compared with the commits fetched before,
+# which needs no network. Before fetching, a TCP connection to the git server
+# tells in a couple of seconds if the network is there, so an offline PC
+# does not wait for git to time out on DNS or TCP.
+
+import os
+import sys
+import time
+import socket
+import threading
+from urllib.parse import urlsplit
+from settings import get_setting, set_setting
+from git import git_check_update, remote_url
+
+kUpdateCheckHours = 6       # hours between two fetches, setting "update_check_hours"
+kProbeTimeout = 2.0         # seconds to reach the git server
+kFetchTimeout = 60.0        # seconds for git fetch
+
+kDefaultPorts = {"https": 443, "http": 80, "ssh": 22, "git": 9418}
+
+# Host and port of the git server of a remote URL, None for a local remote
+def remote_host(url):
+    if not url:
+        return None
+    if "://" in url:
+        parts = urlsplit(url)
+        if parts.scheme not in kDefaultPorts or not parts.hostname:
+            return None
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        return parts.hostname, port or kDefaultPorts[parts.scheme]
+    # scp-like syntax: user@host:path
+    if ":" in url and not os.path.exists(url):
+        host = url.split(":", 1)[0].split("@")[-1]
+        if host and "/" not in host and not (len(host) == 1 and sys.platform == "win32"):
+            return host, kDefaultPorts["ssh"]
+    return None
+
+# Can the git server be reached? DNS lookup and connection together take at
+# most timeout seconds. Behind a proxy only git knows how to get out.
+def network_available(url, timeout = kProbeTimeout):
+    host = remote_host(url)
+    if host is None or any(os.environ.get(name) for name in ("https_proxy", "HTTPS_PROXY", "all_proxy", "ALL_PROXY")):
+        return True
+
+    reached = []
+
+    def probe():
+        try:
+            socket.create_connection(host, timeout = timeout).close()
+            reached.append(True)
+        except OSError:
+            pass
+
+    # getaddrinfo has no timeout of its own
+    thread = threading.Thread(target = probe, name = "update-probe", daemon = True)
+    thread.start()
+    thread.join(timeout)
+    return bool(reached)
+
+class UpdateService:
+    def __init__(self, on_result = None, repo_dir = None):
+        self.on_result = on_result
+        self.repo_dir = repo_dir or os.path.dirname(os.path.abspath(__file__))
+        self._thread = None
+
+    # Is a fetch due?
+    def due(self):
+        hours = get_setting("update_check_hours", kUpdateCheckHours)
+        return time.time() - get_setting("last_update_check", 0) >= hours * 3600
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Check on a worker thread, fetching only if due (or force). on_result
+    # (result, context) is called on that thread with the result of
+    # git_check_update plus "offline". Returns False if a check is running.
+    def check(self, force = False, context = None):
+        if self.running:
+            return False
+        self._thread = threading.Thread(target = self._run, args = (force, context), name = "update-check", daemon = True)
+        self._thread.start()
+        return True
+
+    def _run(self, force, context):
+        try:
+            result = self.check_now(force)
+        except Exception as e:
+            result = {"updated": False, "msg": str(e), "commits": [], "fetched": False, "fetch_error": str(e), "offline": False}
+        if self.on_result:
+            self.on_result(result, context)
+
+    # The check itself, on the calling thread
+    def check_now(self, force = False):
+        fetch = force or self.due()
+        offline = False
+        if fetch and not network_available(remote_url(self.repo_dir)):
+            fetch = False
+            offline = True
+
+        result = git_check_update(repo_dir = self.repo_dir, fetch = fetch, fetch_timeout = kFetchTimeout)
+        if result.get("fetched"):
+            set_setting("last_update_check", time.time())
+        result["offline"] = offline
+        return result
+
+if __name__ == "__main__":
+    force = "--force" in sys.argv[1:]
+    result = UpdateService().check_now(force = force)
+    if result.get("offline"):
+        print("No network: the git server cannot be reached")
+    elif not result.get("fetched"):
+        print(result.get("fetch_error") or f"Not fetched, last fetch less than {get_setting('update_check_hours', kUpdateCheckHours)} hours ago (use --force)")
+    commits = result.get("commits") or []
+    print(f"{len(commits)} commit(s) to apply")
+    for commit in commits:
+        print(f"  {commit['hash'][:8]} {commit['date']} {commit['subject'].splitlines()[0] if commit['subject'] else ''}")
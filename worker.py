@@ -4,9 +4,13 @@
 # worker.py (8-23-2025)
 # By Luca Severini (lucaseverini@mac.com)
 
+import asyncio
 import traceback
-from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import QObject, pyqtSignal
+from punch_async import get_runner
 
+# Runs a punch job on the shared event loop and reports to the GUI by signals.
+# func is a coroutine function, or a plain function run on a worker thread.
 class PunchWorker(QObject):
     finished = pyqtSignal()
     error = pyqtSignal(object)
@@ -18,15 +22,35 @@ class PunchWorker(QObject):
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.future = None
+        self.log_pipeline = None
 
-    @pyqtSlot()
-    def run(self):
+    # Log of the job: posted to the log pipeline if any, otherwise one signal
+    # per message
+    def log(self, msg):
+        if self.log_pipeline is not None:
+            self.log_pipeline.post(msg)
+        else:
+            self.message.emit(msg)
+
+    def start(self):
+        self.future = get_runner().submit(self._run())
+        self.future.add_done_callback(self._done)
+
+    async def _run(self):
+        if asyncio.iscoroutinefunction(self.func):
+            return await self.func(*self.args, **self.kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.func(*self.args, **self.kwargs))
+
+    # Signals emitted from the loop thread are queued to the GUI thread
+    def _done(self, future):
         try:
-            response, aborted, row_range = self.func(*self.args, **self.kwargs)
+            response, aborted, row_range = future.result()
             self.result.emit(response, aborted, row_range)
             
-        except Exception:
-            self.error.emit(traceback.format_exc())
+        except Exception as e:
+            self.error.emit("".join(traceback.format_exception(e)))
             
         finally:
             self.finished.emit()